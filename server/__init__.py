@@ -10,7 +10,6 @@ import flask_login
 from raven.conf import setup_logging
 from raven.contrib.flask import Sentry
 from raven.handlers.logging import SentryHandler
-import mediacloud.api
 from cliff.api import Cliff
 import redis
 import jinja2
@@ -18,8 +17,9 @@ from flask_executor import Executor
 
 from server.sessions import RedisSessionInterface
 from server.util.config import get_default_config, ConfigException
+from server.util.mcclients import MediaCloudClientPool, DEFAULT_MAX_CLIENTS, DEFAULT_CONNECTIONS
 from server.commands import sync_frontend_db
-from server.database import UserDatabase, AnalyticsDatabase
+from server.database import UserDatabase, AnalyticsDatabase, JobDatabase, USER_CACHE_TTL_SECS
 
 SERVER_MODE_DEV = "dev"
 SERVER_MODE_PROD = "prod"
@@ -65,11 +65,21 @@ except ConfigException as e:
 # Connect to MediaCloud
 TOOL_API_KEY = config.get('MEDIA_CLOUD_API_KEY')
 
-mc = mediacloud.api.AdminMediaCloud(TOOL_API_KEY)
 try:
-    mc.V2_API_URL = config.get('MEDIA_CLOUD_API_URL')
+    mc_api_url = config.get('MEDIA_CLOUD_API_URL')
 except ConfigException:
-    pass  # just use the default API url because a custom one is not defined
+    mc_api_url = None  # just use the default API url because a custom one is not defined
+try:
+    mc_max_clients = int(config.get('MC_CLIENT_POOL_MAX_CLIENTS'))
+except ConfigException:
+    mc_max_clients = DEFAULT_MAX_CLIENTS
+try:
+    mc_connections = int(config.get('MC_CLIENT_POOL_CONNECTIONS'))
+except ConfigException:
+    mc_connections = DEFAULT_CONNECTIONS
+# all the clients we make share one HTTP session, so they reuse connections to the back-end
+mc_clients = MediaCloudClientPool(mc_api_url, max_clients=mc_max_clients, connections=mc_connections)
+mc = mc_clients.admin_client(TOOL_API_KEY)
 logger.info("Connected to mediacloud")
 
 # Connect to CLIFF if the settings are there
@@ -83,9 +93,17 @@ NYT_THEME_LABELLER_URL = config.get('NYT_THEME_LABELLER_URL')
 
 # Connect to the app's mongo DB
 try:
-    user_db = UserDatabase(config.get('MONGO_URL'))
+    try:
+        user_cache_secs = int(config.get('USER_CACHE_TTL_SECS'))
+    except ConfigException:
+        user_cache_secs = USER_CACHE_TTL_SECS
+    user_db = UserDatabase(config.get('MONGO_URL'), cache_ttl_secs=user_cache_secs)
     analytics_db = AnalyticsDatabase(config.get('MONGO_URL'))
+    job_db = JobDatabase(config.get('MONGO_URL'))
     user_db.check_connection()
+    user_db.ensure_indexes()
+    analytics_db.ensure_indexes()
+    job_db.ensure_indexes()
     logger.info("Connected to DB: {}".format(config.get('MONGO_URL')))
 except Exception as err:
     logger.error("DB error: {0}".format(err))
@@ -1,11 +1,9 @@
 import datetime
 import logging
 import flask_login
-import mediacloud.api
 from flask import session
 
-from server import user_db, login_manager
-from server.util.config import get_default_config, ConfigException
+from server import user_db, login_manager, mc_clients
 
 logger = logging.getLogger(__name__)
 
@@ -18,9 +16,6 @@ ROLE_STORIES_API = 'stories-api'            # Access to the stories api
 ROLE_SEARCH = 'search'                      # Access to the /search pages
 ROLE_TM_READ_ONLY = 'tm-readonly'           # Topic mapper; excludes media and story editing
 
-# load the config helper
-config = get_default_config()
-
 
 # User class
 class User(flask_login.UserMixin):
@@ -145,12 +140,7 @@ def user_admin_mediacloud_client(user_mc_key=None):
     mc_key_to_use = user_mc_key
     if mc_key_to_use is None:
         mc_key_to_use = user_mediacloud_key()
-    user_mc = mediacloud.api.AdminMediaCloud(mc_key_to_use)
-    try:
-        user_mc.V2_API_URL = config.get('MEDIA_CLOUD_API_URL')
-    except ConfigException:
-        pass  # just use the default API url because a custom one is not defined
-    return user_mc
+    return mc_clients.admin_client(mc_key_to_use)
 
 
 def user_mediacloud_client(user_mc_key=None):
@@ -159,9 +149,4 @@ def user_mediacloud_client(user_mc_key=None):
     mc_key_to_use = user_mc_key
     if mc_key_to_use is None:
         mc_key_to_use = user_mediacloud_key()
-    user_mc = mediacloud.api.MediaCloud(mc_key_to_use)
-    try:
-        user_mc.V2_API_URL = config.get('MEDIA_CLOUD_API_URL')
-    except ConfigException:
-        pass  # just use the default API url because a custom one is not defined
-    return user_mc
+    return mc_clients.user_client(mc_key_to_use)
@@ -1,7 +1,112 @@
-from dogpile.cache import make_region
+import copy
+import datetime
+import hashlib
+import inspect
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dogpile.cache import register_backend
+from dogpile.cache.api import NO_VALUE, CachedValue
+from dogpile.cache.backends.redis import RedisBackend
+from dogpile.cache.proxy import ProxyBackend
+from dogpile.cache.region import CacheRegion
 from dogpile.cache.util import compat
 
 from server import config
+from server.util.config import ConfigException
+from server.util.serializer import CompactSerializer, FORMAT_MSGPACK, COMPRESSION_ZLIB
+
+logger = logging.getLogger(__name__)
+
+REDIS_EXPIRATION_SECS = 60*60*24*3   # 3 days
+
+# defaults for the tunable parts of the cache; override any of these in app.config or with env-vars
+CACHE_SETTING_DEFAULTS = {
+    # the in-process tier
+    'LOCAL_CACHE_ENABLED': 1,
+    'LOCAL_CACHE_TTL_SECS': 60*5,                   # much shorter than Redis, so stale data doesn't stick around
+    'LOCAL_CACHE_MAX_ITEMS': 5000,
+    'LOCAL_CACHE_MAX_BYTES': 64*1024*1024,          # per worker
+    'LOCAL_CACHE_MAX_ITEM_BYTES': 1024*1024,        # big payloads (ie. story list pages) only live in Redis
+    # how things are stored in Redis
+    'CACHE_KEY_FORMAT': 'canonical',
+    'CACHE_SERIALIZER': FORMAT_MSGPACK,
+    'CACHE_COMPRESSION': COMPRESSION_ZLIB,
+    'CACHE_COMPRESS_THRESHOLD_BYTES': 1024,
+}
+
+
+def _cache_setting(name):
+    try:
+        value = config.get(name)
+    except ConfigException:
+        return CACHE_SETTING_DEFAULTS[name]
+    return int(value) if isinstance(CACHE_SETTING_DEFAULTS[name], int) else value.lower()
+
+
+# The legacy format is kept around so you can switch back to reusing keys already in Redis while migrating. Switching
+# formats effectively starts you off with an empty cache, because none of the keys will match.
+CACHE_KEY_FORMAT_LEGACY = 'legacy'
+CACHE_KEY_FORMAT_CANONICAL = 'canonical'
+CANONICAL_KEY_PREFIX = 'v3'
+CANONICAL_KEY_MAX_LENGTH = 250     # longer keys than this (ie. with big solr queries) get hashed
+
+
+def _cache_key_format():
+    key_format = _cache_setting('CACHE_KEY_FORMAT')
+    if key_format not in [CACHE_KEY_FORMAT_LEGACY, CACHE_KEY_FORMAT_CANONICAL]:
+        raise ConfigException("Unknown CACHE_KEY_FORMAT '{}'".format(key_format))
+    return key_format
+
+
+def _canonical_str(value):
+    # length-prefixed, so nothing inside a string (ie. a "|" in a solr query) can be mistaken for a separator
+    return "{}:{}".format(len(value), value)
+
+
+def _canonical_dict(value):
+    items = sorted([(canonical_arg(k), canonical_arg(v)) for k, v in value.items()])
+    return "{{{}}}".format(",".join(["{}={}".format(k, v) for k, v in items]))
+
+
+# (types, type tag, encoder) for each kind of argument; checked in order, so bool has to come before int
+_CANONICAL_ENCODERS = [
+    ((str,), 's', _canonical_str),
+    ((bool,), 'b', lambda v: '1' if v else '0'),
+    ((int,), 'i', str),
+    ((float,), 'f', repr),
+    ((datetime.datetime, datetime.date), 'd', lambda v: v.isoformat()),
+    ((list, tuple), 'l', lambda v: "[{}]".format(",".join([canonical_arg(i) for i in v]))),
+    ((set, frozenset), 'e', lambda v: "[{}]".format(",".join(sorted([canonical_arg(i) for i in v])))),
+    ((dict,), 'm', _canonical_dict),
+]
+
+
+def canonical_arg(value):
+    """
+    Turn an argument into a string that is the same every time for equivalent values, and different for different
+    ones. Each value is tagged with its type (so `1`, `'1'` and `True` don't collide) and strings are length-prefixed.
+    Dicts and sets are sorted, lists keep their order (it often matters to the results).
+    """
+    if value is None:
+        return 'n'
+    for types, tag, encoder in _CANONICAL_ENCODERS:
+        if isinstance(value, types):
+            return tag + encoder(value)
+    return "o{}{}".format(type(value).__name__, _canonical_str(str(value)))
+
+
+def canonical_key(namespace, fn_args, kw):
+    kw_keys = ["{}={}".format(k, canonical_arg(kw[k])) for k in sorted(kw.keys())]
+    args_part = "|".join([canonical_arg(arg) for arg in fn_args] + kw_keys)
+    key = "{}:{}|{}".format(CANONICAL_KEY_PREFIX, namespace, args_part)
+    if len(key) > CANONICAL_KEY_MAX_LENGTH:
+        # keep the namespace readable so you can still tell what is in Redis
+        digest = hashlib.sha1(args_part.encode('utf-8')).hexdigest()
+        key = "{}:{}|sha1:{}".format(CANONICAL_KEY_PREFIX, namespace, digest)
+    return key
 
 
 def _keyword_safe_key_generator(namespace, fn):
@@ -15,23 +120,319 @@ def _keyword_safe_key_generator(namespace, fn):
     # pylint: disable=deprecated-method
     args = compat.inspect_getargspec(fn)
     has_self = args[0] and args[0][0] in ('self', 'cls')
+    use_canonical_keys = _cache_key_format() == CACHE_KEY_FORMAT_CANONICAL
 
     def generate_key(*fn_args, **kw):
-        kw_keys = ["{}_{}".format(k, v) for k, v in kw.items()]
         if has_self:
             fn_args = fn_args[1:]
+        if use_canonical_keys:
+            return canonical_key(namespace, fn_args, kw)
+        kw_keys = ["{}_{}".format(k, v) for k, v in kw.items()]
         fn_args_as_strings = ["{}".format(arg) for arg in fn_args]
         return namespace + "|" + " ".join(fn_args_as_strings + kw_keys)
     return generate_key
 
 
-cache = make_region(function_key_generator=_keyword_safe_key_generator).configure(
-    'dogpile.cache.redis',
+class LocalLRUCacheProxy(ProxyBackend):
+    """
+    An in-process LRU tier that sits in front of the shared Redis backend. Each gunicorn worker gets its own copy, so
+    hot keys (tags, media, tag set files) are served without a network round-trip. Entries are held as pickled bytes,
+    which means callers still get their own copy of the results (some of them mutate what they get back), and which
+    gives us an exact size to bound the tier by. Entries expire well before the Redis ones do.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ttl = _cache_setting('LOCAL_CACHE_TTL_SECS')
+        self.max_items = _cache_setting('LOCAL_CACHE_MAX_ITEMS')
+        self.max_bytes = _cache_setting('LOCAL_CACHE_MAX_BYTES')
+        self.max_item_bytes = _cache_setting('LOCAL_CACHE_MAX_ITEM_BYTES')
+        self._entries = OrderedDict()  # key => (expires_at, payload bytes)
+        self._lock = threading.Lock()
+        # the hit/miss counters, plus how many bytes are in the local tier right now
+        self._counts = {'local_hits': 0, 'local_misses': 0, 'redis_hits': 0, 'redis_misses': 0,
+                        'local_evictions': 0, 'local_bytes': 0}
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._counts[counter] += amount
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return NO_VALUE
+            expires_at, payload = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return NO_VALUE
+            self._entries.move_to_end(key)
+        return pickle.loads(payload)
+
+    def _local_set(self, key, value):
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remove(key)
+            if len(payload) > self.max_item_bytes:
+                return
+            self._entries[key] = (time.time() + self.ttl, payload)
+            self._counts['local_bytes'] += len(payload)
+            while (len(self._entries) > self.max_items) or (self._counts['local_bytes'] > self.max_bytes):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._counts['local_evictions'] += 1
+
+    def _remove(self, key):
+        # only call this when you already hold the lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._counts['local_bytes'] -= len(entry[1])
+
+    def get(self, key):
+        value = self._local_get(key)
+        if value is not NO_VALUE:
+            self._count('local_hits')
+            return value
+        self._count('local_misses')
+        value = self.proxied.get(key)
+        if value is NO_VALUE:
+            self._count('redis_misses')
+        else:
+            self._count('redis_hits')
+            self._local_set(key, value)
+        return value
+
+    def get_multi(self, keys):
+        values = [self._local_get(k) for k in keys]
+        missing_keys = [k for k, v in zip(keys, values) if v is NO_VALUE]
+        self._count('local_hits', len(keys) - len(missing_keys))
+        self._count('local_misses', len(missing_keys))
+        if len(missing_keys) > 0:
+            from_redis = dict(zip(missing_keys, self.proxied.get_multi(missing_keys)))
+            for k, v in from_redis.items():
+                if v is NO_VALUE:
+                    self._count('redis_misses')
+                else:
+                    self._count('redis_hits')
+                    self._local_set(k, v)
+            values = [from_redis[k] if v is NO_VALUE else v for k, v in zip(keys, values)]
+        return values
+
+    def set(self, key, value):
+        self.proxied.set(key, value)
+        self._local_set(key, value)
+
+    def set_multi(self, mapping):
+        self.proxied.set_multi(mapping)
+        for k, v in mapping.items():
+            self._local_set(k, v)
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+        self.proxied.delete(key)
+
+    def delete_multi(self, keys):
+        with self._lock:
+            for k in keys:
+                self._remove(k)
+        self.proxied.delete_multi(keys)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['local_items'] = len(self._entries)
+        local_lookups = stats['local_hits'] + stats['local_misses']
+        redis_lookups = stats['redis_hits'] + stats['redis_misses']
+        stats['local_hit_rate'] = float(stats['local_hits']) / local_lookups if local_lookups else 0
+        stats['redis_hit_rate'] = float(stats['redis_hits']) / redis_lookups if redis_lookups else 0
+        return stats
+
+
+class SerializingRedisBackend(RedisBackend):
+    """
+    The stock dogpile Redis backend, but storing values with our compact serializer instead of pickle. This shrinks big
+    payloads (story list pages, sentence lists, word counts) a lot, which saves Redis memory and network time.
+    """
+
+    def __init__(self, arguments):
+        arguments = arguments.copy()
+        self.serializer = arguments.pop('serializer')
+        super().__init__(arguments)
+
+    def _dumps(self, value):
+        # dogpile hands us a CachedValue, which is a (payload, metadata) tuple
+        return self.serializer.dumps([value.payload, value.metadata])
+
+    def _loads(self, data):
+        decoded = self.serializer.loads(data)
+        if isinstance(decoded, CachedValue):   # pickled by the stock backend before we switched
+            return decoded
+        return CachedValue(*decoded)
+
+    def get(self, key):
+        value = self.client.get(key)
+        if value is None:
+            return NO_VALUE
+        return self._loads(value)
+
+    def get_multi(self, keys):
+        if not keys:
+            return []
+        values = self.client.mget(keys)
+        return [self._loads(v) if v is not None else NO_VALUE for v in values]
+
+    def set(self, key, value):
+        if self.redis_expiration_time:
+            self.client.setex(key, self.redis_expiration_time, self._dumps(value))
+        else:
+            self.client.set(key, self._dumps(value))
+
+    def set_multi(self, mapping):
+        mapping = {k: self._dumps(v) for k, v in mapping.items()}
+        if not self.redis_expiration_time:
+            self.client.mset(mapping)
+        else:
+            pipe = self.client.pipeline()
+            for key, value in mapping.items():
+                pipe.setex(key, self.redis_expiration_time, value)
+            pipe.execute()
+
+
+register_backend('server.redis', 'server.cache', 'SerializingRedisBackend')
+
+
+class _InFlightCall:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Lets concurrent calls with the same key share one execution. The first caller runs the function; anyone else who
+    asks for the same key while it is running waits and gets a copy of the same result (or the same exception). Copies,
+    because some callers modify the results they get back.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key => _InFlightCall
+        self.coalesced_count = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+                self.coalesced_count += 1
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+        try:
+            result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]   # nobody new can start waiting once this is gone
+            if (call.error is None) and (call.waiters > 0):
+                call.result = copy.deepcopy(result)  # snapshot it before our caller can change it
+            call.done.set()
+        return result
+
+
+class CoalescingCacheRegion(CacheRegion):
+    """
+    The distributed Redis lock stops different workers from all calling the back-end for the same key, but threads
+    within one worker (ie. the flask_executor pool, or parallel requests from a dashboard loading) would each poll
+    that lock. This makes them share a single lookup-and-create instead.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = SingleFlight()
+
+    def get_or_create(self, key, creator, expiration_time=None, should_cache_fn=None, creator_args=None):
+        parent = super()
+        return self.in_flight.do(key, lambda: parent.get_or_create(key, creator, expiration_time, should_cache_fn,
+                                                                   creator_args))
+
+
+cache_serializer = CompactSerializer(data_format=_cache_setting('CACHE_SERIALIZER'),
+                                     compression=_cache_setting('CACHE_COMPRESSION'),
+                                     compress_threshold=_cache_setting('CACHE_COMPRESS_THRESHOLD_BYTES'))
+
+cache = CoalescingCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+    'server.redis',
     arguments={
         'url': config.get('CACHE_REDIS_URL'),
         'port': 6379,
         'db': 0,
-        'redis_expiration_time': 60*60*24*3,   # 3 days
-        'distributed_lock': True
-        }
+        'redis_expiration_time': REDIS_EXPIRATION_SECS,
+        'distributed_lock': True,
+        'serializer': cache_serializer,
+        },
+    wrap=[LocalLRUCacheProxy] if _cache_setting('LOCAL_CACHE_ENABLED') == 1 else None
 )
+
+
+def cache_stats():
+    """
+    :return: hit/miss counts for each tier of the cache, for this worker process only
+    """
+    if isinstance(cache.backend, LocalLRUCacheProxy):
+        stats = cache.backend.stats()
+    else:
+        stats = {'local_cache_enabled': False}
+    stats['coalesced_calls'] = cache.in_flight.coalesced_count
+    return stats
+
+
+def cache_keys_for_calls(cached_fn, calls):
+    """
+    The cache keys that calling a `@cache.cache_on_arguments()` function with each of the (args, kwargs) in `calls`
+    would use. The decorator binds the arguments to the function's signature before making the key (so named
+    parameters passed as keywords become positional, and defaults are filled in), so we have to do the same here.
+    """
+    fn = cached_fn.original
+    signature = inspect.signature(fn)
+    key_generator = _keyword_safe_key_generator(None, fn)
+    keys = []
+    for args, kwargs in calls:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        keys.append(key_generator(*bound.args, **bound.kwargs))
+    return keys
+
+
+def get_cached_multi(cached_fn, calls):
+    """
+    Look up the cached results for a batch of calls to a `@cache.cache_on_arguments()` function in one round-trip,
+    without calling the function for anything that isn't cached.
+    :param cached_fn: the decorated function
+    :param calls: a list of (args, kwargs) tuples, one for each call you want to look up
+    :return: a list of results in the same order as the calls, with `NO_VALUE` for anything that isn't cached
+    """
+    return cache.get_multi(cache_keys_for_calls(cached_fn, calls))
+
+
+def set_cached_multi(cached_fn, calls, values):
+    """
+    Save the results for a batch of calls to a `@cache.cache_on_arguments()` function in one round-trip (a pipeline,
+    in Redis), as if each call had been made on its own.
+    :param cached_fn: the decorated function
+    :param calls: a list of (args, kwargs) tuples
+    :param values: the results to save, in the same order as the calls
+    """
+    cache.set_multi(dict(zip(cache_keys_for_calls(cached_fn, calls), values)))
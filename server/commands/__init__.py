@@ -33,7 +33,7 @@ def sync_frontend_db(test):
     users_to_remove = user_db.get_users({
         "$and":
             [{"username": {"$ne": email}} for email in backend_emails]
-    })
+    }, fields=['username'])
     print("'{}' users to remove".format(users_to_remove.count()))
 
     if test:
@@ -1,9 +1,27 @@
+import atexit
+import copy
 import datetime
 import logging
-from pymongo import MongoClient, DESCENDING
+import threading
+import time
+from collections import Counter
+from flask import g, has_request_context
+from pymongo import MongoClient, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
 
 logger = logging.getLogger(__name__)
 
+USER_CACHE_TTL_SECS = 15
+
+ANALYTICS_FLUSH_SECS = 5            # how often buffered analytics counts are written to the DB
+ANALYTICS_FLUSH_MAX_PENDING = 500   # write sooner if this many different counts are waiting
+
+JOB_EXPIRY_SECS = 7 * 24 * 60 * 60  # background job records are deleted automatically after this long
+JOB_HEARTBEAT_SECS = 60             # how often the process running a job marks it as still alive
+JOB_STALE_SECS = 10 * 60            # a queued or running job that hasn't been updated in this long has been lost
+
 
 class AppDatabase:
     # DB wrapper for accessing local storage that supports the app.
@@ -19,15 +37,127 @@ class AppDatabase:
     def check_connection(self):
         return self._conn.test.insert_one({'dummy': 'test'})
 
+    def ensure_indexes(self):
+        # subclasses should create the indexes their queries need here; this is called once at startup
+        pass
+
+    def _ensure_index(self, collection_name, keys, **kwargs):
+        # creating an index that already exists is a no-op, so this is safe to call on every startup
+        try:
+            self._conn[collection_name].create_index(keys, background=True, **kwargs)
+        except OperationFailure as e:
+            # ie. a unique index can't be built because there are already duplicates in the DB; the app still works
+            # without it, so log it for someone to clean up rather than refusing to start
+            logger.error("Couldn't create index {} on {}: {}".format(keys, collection_name, e))
+
+
+class _UserCache:
+    """
+    Keeps user documents around so we don't hit Mongo for the same user many times on each page view. Lookups check
+    the current request first, then a short-lived per-process cache. Writes through UserDatabase invalidate the user
+    here, but other worker processes can still see the old document for up to `ttl_secs`. Lookups by api key only use
+    the per-request layer, so a key that was reset or revoked (in another process) stops working right away.
+    """
+
+    REQUEST_ONLY_PROPS = frozenset(['api_key'])
+
+    def __init__(self, ttl_secs):
+        self.ttl_secs = ttl_secs
+        self._docs = {}                 # (prop_name, prop_value) => (expires_at, user document)
+        self._keys_by_username = {}     # username => set of the keys above that hold that user
+        self._generation = 0            # bumped on every invalidation
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _request_docs():
+        if not has_request_context():
+            return None
+        if 'user_docs' not in g:
+            g.user_docs = {}
+        return g.user_docs
+
+    def get(self, prop_name, prop_value):
+        key = (prop_name, prop_value)
+        request_docs = self._request_docs()
+        if (request_docs is not None) and (key in request_docs):
+            return request_docs[key]
+        if prop_name in self.REQUEST_ONLY_PROPS:
+            return None
+        with self._lock:
+            cached = self._docs.get(key)
+            if (cached is not None) and (cached[0] < time.time()):
+                del self._docs[key]
+                cached = None
+        if cached is None:
+            return None
+        # hand out a copy, so callers that change the document don't change it for everyone else
+        doc = copy.deepcopy(cached[1])
+        if request_docs is not None:
+            request_docs[key] = doc
+        return doc
+
+    def generation(self):
+        return self._generation
+
+    def set(self, prop_name, prop_value, doc, generation):
+        """
+        Remember a document read from the DB. Pass in the `generation()` from before you read it; if anything was
+        invalidated since then the document might be out of date, so it only gets saved for this request.
+        """
+        # file it under both ways we look users up, so finding them by api key (on login) also covers later lookups by
+        # username (on favorites and such)
+        keys = [(prop_name, prop_value), ('username', doc['username']), ('api_key', doc.get('api_key'))]
+        keys = [key for key in set(keys) if key[1] is not None]
+        request_docs = self._request_docs()
+        if request_docs is not None:
+            for key in keys:
+                request_docs[key] = doc
+        keys = [key for key in keys if key[0] not in self.REQUEST_ONLY_PROPS]
+        if (self.ttl_secs <= 0) or (len(keys) == 0):
+            return
+        cached = (time.time() + self.ttl_secs, copy.deepcopy(doc))
+        with self._lock:
+            if generation != self._generation:
+                return
+            for key in keys:
+                self._docs[key] = cached
+            self._keys_by_username.setdefault(doc['username'], set()).update(keys)
+
+    def invalidate(self, username):
+        request_docs = self._request_docs()
+        if request_docs is not None:
+            request_docs.clear()
+        with self._lock:
+            self._generation += 1
+            for key in self._keys_by_username.pop(username, set()):
+                self._docs.pop(key, None)
+
+    def clear(self):
+        request_docs = self._request_docs()
+        if request_docs is not None:
+            request_docs.clear()
+        with self._lock:
+            self._generation += 1
+            self._docs.clear()
+            self._keys_by_username.clear()
+
 
 class UserDatabase(AppDatabase):
     # DB access for maintaining user-related data; one document per user
 
+    def __init__(self, db_uri, cache_ttl_secs=USER_CACHE_TTL_SECS):
+        super(UserDatabase, self).__init__(db_uri)
+        self._user_cache = _UserCache(cache_ttl_secs)
+
+    def ensure_indexes(self):
+        self._ensure_index('users', [('username', ASCENDING)], unique=True)
+        self._ensure_index('users', [('api_key', ASCENDING)], unique=True)
+
     def includes_user_named(self, username):
         return self.find_by_username(username) is not None
 
     def add_user(self, username, api_key, profile):
-        return self._conn.users.insert({
+        result = self._conn.users.insert({
             'username': username,
             'api_key': api_key,
             'profile': profile,
@@ -37,9 +167,13 @@ class UserDatabase(AppDatabase):
             'savedQueries': [],  # holdover from Dashboard
             'searches': [],
         })
+        self._user_cache.invalidate(username)
+        return result
 
     def delete_user(self, username):
-        return self._conn.users.delete_one({'username': username})
+        result = self._conn.users.delete_one({'username': username})
+        self._user_cache.invalidate(username)
+        return result
 
     def find_by_username(self, username):
         return self._find_user_by_prop('username', username)
@@ -48,29 +182,97 @@ class UserDatabase(AppDatabase):
         return self._find_user_by_prop('api_key', api_key)
 
     def _find_user_by_prop(self, prop_name, prop_value):
-        return self._conn.users.find_one({prop_name: prop_value})
+        if prop_value is None:
+            return None
+        user = self._user_cache.get(prop_name, prop_value)
+        if user is None:
+            generation = self._user_cache.generation()
+            user = self._conn.users.find_one({prop_name: prop_value})
+            if user is not None:
+                self._user_cache.set(prop_name, prop_value, user, generation)
+        return user
 
     def get_users_lists(self, username, list_name):
-        user_data = self.find_by_username(username)
-        if list_name in user_data:
+        user_data = self._user_cache.get('username', username)
+        if user_data is None:
+            # just ask for the one list, rather than the whole user (which includes all their saved searches)
+            user_data = self._conn.users.find_one({'username': username}, {list_name: 1, '_id': 0})
+        if (user_data is not None) and (list_name in user_data):
             return user_data[list_name]
         # be a little safe about checking for lists
         return []
 
     def add_item_to_users_list(self, username, list_name, item):
-        return self._conn.users.update_one({'username': username}, {'$push': {list_name: item}})
+        result = self._conn.users.update_one({'username': username}, {'$push': {list_name: item}})
+        self._user_cache.invalidate(username)
+        return result
 
     def remove_item_from_users_list(self, username, list_name, item):
-        return self._conn.users.update_one({'username': username}, {'$pull': {list_name: item}})
+        result = self._conn.users.update_one({'username': username}, {'$pull': {list_name: item}})
+        self._user_cache.invalidate(username)
+        return result
 
     def update_user(self, username, values_to_update):
-        return self._conn.users.update_one({'username': username}, {'$set': values_to_update})
+        result = self._conn.users.update_one({'username': username}, {'$set': values_to_update})
+        self._user_cache.invalidate(username)
+        return result
 
-    def get_users(self, query_operator=None):
-        return self._conn.users.find(query_operator or {})
+    def get_users(self, query_operator=None, fields=None):
+        # pass in a list of `fields` to get back just those properties of each user
+        projection = {f: 1 for f in fields} if fields is not None else None
+        return self._conn.users.find(query_operator or {}, projection)
 
     def delete_users(self, query_operator):
-        return self._conn.users.delete_many(query_operator)
+        result = self._conn.users.delete_many(query_operator)
+        self._user_cache.clear()
+        return result
+
+
+class _BufferedIncrements:
+    """
+    Adds up increments in memory and hands them to `write_fn` in batches from a background thread, every `flush_secs`
+    or as soon as `max_pending` different keys are waiting. If a write fails the counts are put back to try again on
+    the next flush.
+    """
+
+    def __init__(self, write_fn, flush_secs=ANALYTICS_FLUSH_SECS, max_pending=ANALYTICS_FLUSH_MAX_PENDING):
+        self._write_fn = write_fn
+        self.flush_secs = flush_secs
+        self.max_pending = max_pending
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, key, amount=1):
+        with self._lock:
+            self._counts[key] += amount
+            full = len(self._counts) >= self.max_pending
+            if self._thread is None:
+                # started on first use, so it lives in the worker process rather than the one that forked it
+                self._thread = threading.Thread(target=self._run, name="buffered-increments", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_secs)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if len(counts) == 0:
+            return
+        try:
+            self._write_fn(counts)
+        except Exception as e:
+            logger.exception(e)
+            with self._lock:
+                self._counts.update(counts)
 
 
 class AnalyticsDatabase(AppDatabase):
@@ -81,12 +283,28 @@ class AnalyticsDatabase(AppDatabase):
 
     ACTION_SOURCE_MGR_VIEW = 'sources-view'
     ACTION_EXPLORER_QUERY = 'explorer-query'
+    ACTIONS = [ACTION_SOURCE_MGR_VIEW, ACTION_EXPLORER_QUERY]
+
+    def __init__(self, db_uri):
+        super(AnalyticsDatabase, self).__init__(db_uri)
+        self._pending = _BufferedIncrements(self._write_increments)
+
+    def ensure_indexes(self):
+        # increment_count upserts by type and id
+        self._ensure_index('analytics', [('type', ASCENDING), ('id', ASCENDING)])
+        # top filters by type and sorts by an action's count
+        for action in self.ACTIONS:
+            self._ensure_index('analytics', [('type', ASCENDING), (action, DESCENDING)])
+
+    @staticmethod
+    def _is_valid_id(the_id):
+        return the_id not in [None, '', 'undefined'] and int(the_id) > 0  # some extra validation
 
     def increment_count(self, the_type, the_id, the_action, amount=1):
         # type - media | collection
         # id - media_id | tags_id
         # action - explorer-query | sources-view | topics-usage
-        if the_id not in [None, '', 'undefined'] and int(the_id) > 0:  # some extra validation
+        if self._is_valid_id(the_id):
             return self._conn.analytics.update_one(
                 {'type': the_type, 'id': int(the_id)},
                 {'$inc': {the_action: amount}},
@@ -94,5 +312,141 @@ class AnalyticsDatabase(AppDatabase):
             )
         return None
 
+    def queue_increment_count(self, the_type, the_id, the_action, amount=1):
+        # same as increment_count, but returns right away and the count is written to the DB in the background (with
+        # any others that came in around the same time)
+        if self._is_valid_id(the_id):
+            self._pending.add((the_type, int(the_id), the_action), amount)
+
+    def flush_counts(self):
+        self._pending.flush()
+
+    def _write_increments(self, counts):
+        # one upsert per item, with all the actions that were counted for it
+        incs_by_item = {}
+        for (the_type, the_id, the_action), amount in counts.items():
+            incs_by_item.setdefault((the_type, the_id), {})[the_action] = amount
+        self._conn.analytics.bulk_write([
+            UpdateOne({'type': the_type, 'id': the_id}, {'$inc': incs}, upsert=True)
+            for (the_type, the_id), incs in incs_by_item.items()
+        ], ordered=False)
+
     def top(self, the_type, the_action, limit=50):
         return self._conn.analytics.find({'type': the_type}).sort(the_action, DESCENDING).limit(limit)
+
+
+class _JobHeartbeat:
+    """
+    Calls `touch_fn` with the ids of the jobs this process is working on (queued or running) every `interval_secs`,
+    from a background thread, so a job that is just waiting its turn or in the middle of a slow step still looks alive.
+    If the process goes away the heartbeats stop, and the job can be reported as lost.
+    """
+
+    def __init__(self, touch_fn, interval_secs=JOB_HEARTBEAT_SECS):
+        self._touch_fn = touch_fn
+        self.interval_secs = interval_secs
+        self._job_ids = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, job_id):
+        with self._lock:
+            self._job_ids.add(job_id)
+            if self._thread is None:
+                # started on first use, so it lives in the worker process rather than the one that forked it
+                self._thread = threading.Thread(target=self._run, name="job-heartbeat", daemon=True)
+                self._thread.start()
+
+    def remove(self, job_id):
+        with self._lock:
+            self._job_ids.discard(job_id)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_secs)
+            with self._lock:
+                job_ids = list(self._job_ids)
+            if len(job_ids) == 0:
+                continue
+            try:
+                self._touch_fn(job_ids)
+            except Exception as e:
+                logger.exception(e)
+
+
+class JobDatabase(AppDatabase):
+    # DB access for tracking long-running background jobs (ie. bulk source uploads); one document per job, which the
+    # job updates as it goes and the UI polls for progress. These are kept in the DB (not in memory) so any server
+    # process can answer the polling requests.
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETE = 'complete'
+    STATUS_ERROR = 'error'
+
+    LOST_JOB_MESSAGE = "This job stopped unexpectedly (the server restarted while it was working on it). " \
+                       "Please try again."
+
+    def __init__(self, db_uri):
+        super().__init__(db_uri)
+        self._heartbeat = _JobHeartbeat(self.touch_jobs)
+
+    def ensure_indexes(self):
+        # clean up old jobs automatically
+        self._ensure_index('jobs', [('created', ASCENDING)], expireAfterSeconds=JOB_EXPIRY_SECS)
+
+    def add_job(self, job_type, username, info=None):
+        now = datetime.datetime.utcnow()
+        job = {
+            'type': job_type,
+            'username': username,
+            'status': self.STATUS_QUEUED,
+            'created': now,
+            'updated': now,
+            'progress': {},
+            'results': [],
+        }
+        job.update(info or {})
+        result = self._conn.jobs.insert_one(job)
+        return str(result.inserted_id)
+
+    def update_job(self, job_id, values_to_set=None, progress_to_add=None, results_to_add=None):
+        # all in one write, so someone polling never sees results without the progress counts that go with them
+        update = {'$set': dict(values_to_set or {}, updated=datetime.datetime.utcnow())}
+        if progress_to_add:
+            update['$inc'] = {'progress.{}'.format(k): v for k, v in progress_to_add.items()}
+        if results_to_add:
+            update['$push'] = {'results': {'$each': results_to_add}}
+        return self._conn.jobs.update_one({'_id': ObjectId(job_id)}, update)
+
+    def touch_jobs(self, job_ids):
+        return self._conn.jobs.update_many({'_id': {'$in': [ObjectId(j) for j in job_ids]}},
+                                           {'$set': {'updated': datetime.datetime.utcnow()}})
+
+    def start_heartbeat(self, job_id):
+        # call this once the job has been handed to something in this process that will run it
+        self._heartbeat.add(job_id)
+
+    def stop_heartbeat(self, job_id):
+        self._heartbeat.remove(job_id)
+
+    def find_job(self, job_id, username):
+        # only the user that started a job can see it
+        try:
+            job = self._conn.jobs.find_one({'_id': ObjectId(job_id), 'username': username})
+        except InvalidId:
+            return None
+        if job is None:
+            return None
+        if self._is_lost(job):
+            # the process running it went away (ie. a restart or deploy), so it is never going to finish
+            lost = {'status': self.STATUS_ERROR, 'message': self.LOST_JOB_MESSAGE}
+            self._conn.jobs.update_one({'_id': job['_id'], 'updated': job['updated']}, {'$set': lost})
+            job.update(lost)
+        job['job_id'] = str(job.pop('_id'))
+        return job
+
+    def _is_lost(self, job):
+        if job['status'] not in [self.STATUS_QUEUED, self.STATUS_RUNNING]:
+            return False
+        return job['updated'] < datetime.datetime.utcnow() - datetime.timedelta(seconds=JOB_STALE_SECS)
@@ -1,12 +1,12 @@
 from collections import defaultdict
 import datetime as dt
-import requests
 from typing import List, Dict
 import logging
 
 from server.platforms.provider import ContentProvider, MC_DATE_FORMAT
 from server.cache import cache
 from server.util.dates import unix_to_solr_date
+import server.util.http_client as http_client
 
 PS_REDDIT_SEARCH_URL = 'https://api.pushshift.io/reddit/submission/search/?'
 
@@ -101,7 +101,7 @@ class RedditPushshiftProvider(ContentProvider):
             params['before'] = unix_to_solr_date(int(end_date.timestamp()))
         # and now add in any other arguments they have sent in
         params.update(kwargs)
-        r = requests.get(PS_REDDIT_SEARCH_URL, headers=headers, params=params)
+        r = http_client.get(PS_REDDIT_SEARCH_URL, headers=headers, params=params, upstream='reddit-pushshift')
         # temp = r.url # useful assignment for debugging investigations
         return r.json()
 
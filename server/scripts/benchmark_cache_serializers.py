@@ -0,0 +1,77 @@
+"""
+Compare the size and speed of the different ways we can store cached results in Redis. This samples real payloads
+out of the cache (by default the big ones - story list pages, sentence lists and topic word counts), so run it against
+a Redis that has been in use for a while. For example:
+    python -m server.scripts.benchmark_cache_serializers _cached_topic_story_list _cached_sentence_list
+"""
+import logging
+import pickle
+import sys
+import timeit
+import redis
+
+from server import config
+from server.cache import cache_serializer
+from server.util.serializer import CompactSerializer, FORMAT_PICKLE, FORMAT_MSGPACK, COMPRESSION_NONE, \
+    COMPRESSION_ZLIB, COMPRESSION_LZ4
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAMESPACES = ['_cached_topic_story_list', '_cached_sentence_list', 'cached_topic_word_counts']
+SAMPLES_PER_NAMESPACE = 20
+TIMING_REPEATS = 20
+
+SERIALIZERS = {
+    'pickle (old default)': CompactSerializer(FORMAT_PICKLE, COMPRESSION_NONE),
+    'pickle + zlib': CompactSerializer(FORMAT_PICKLE, COMPRESSION_ZLIB),
+    'msgpack': CompactSerializer(FORMAT_MSGPACK, COMPRESSION_NONE),
+    'msgpack + zlib': CompactSerializer(FORMAT_MSGPACK, COMPRESSION_ZLIB),
+    'msgpack + lz4': CompactSerializer(FORMAT_MSGPACK, COMPRESSION_LZ4),
+}
+
+
+def sample_payloads(namespace, sample_size=SAMPLES_PER_NAMESPACE):
+    client = redis.StrictRedis.from_url(config.get('CACHE_REDIS_URL'))
+    payloads = []
+    for key in client.scan_iter(match="*:{}|*".format(namespace), count=1000):
+        raw = client.get(key)
+        if raw is None:
+            continue
+        payloads.append(pickle.loads(raw).payload if raw[:1] == b'\x80' else cache_serializer.loads(raw)[0])
+        if len(payloads) >= sample_size:
+            break
+    return payloads
+
+
+def benchmark(payloads):
+    results = {}
+    for name, serializer in SERIALIZERS.items():
+        encoded = [serializer.dumps(p) for p in payloads]
+        encode_secs = timeit.timeit(lambda s=serializer: [s.dumps(p) for p in payloads], number=TIMING_REPEATS)
+        decode_secs = timeit.timeit(lambda s=serializer, encoded=encoded: [s.loads(e) for e in encoded],
+                                    number=TIMING_REPEATS)
+        results[name] = {
+            'bytes': sum([len(e) for e in encoded]),
+            'encode_ms': 1000 * encode_secs / (TIMING_REPEATS * len(payloads)),
+            'decode_ms': 1000 * decode_secs / (TIMING_REPEATS * len(payloads)),
+        }
+    return results
+
+
+def print_results(namespace, payload_count, results):
+    baseline = results['pickle (old default)']['bytes']
+    print("{} ({} payloads)".format(namespace, payload_count))
+    print("  {:<22}{:>14}{:>10}{:>14}{:>14}".format('serializer', 'total bytes', 'vs pickle', 'encode ms', 'decode ms'))
+    for name, r in results.items():
+        print("  {:<22}{:>14}{:>10.2f}{:>14.3f}{:>14.3f}".format(name, r['bytes'], float(r['bytes']) / baseline,
+                                                                  r['encode_ms'], r['decode_ms']))
+
+
+if __name__ == '__main__':
+    namespaces = sys.argv[1:] if len(sys.argv) > 1 else DEFAULT_NAMESPACES
+    for ns in namespaces:
+        sample = sample_payloads(ns)
+        if len(sample) == 0:
+            logger.warning("No cached payloads found for {}".format(ns))
+            continue
+        print_results(ns, len(sample), benchmark(sample))
@@ -0,0 +1,49 @@
+"""
+Time streaming a big csv export (1 million story-like rows by default), comparing the csv module based
+stream_csv_chunks to building each row by hand with dict2row.
+    python -m server.scripts.benchmark_csv_streaming [row_count]
+"""
+import sys
+import time
+
+from server.util.csv import dict2row, stream_csv_chunks
+
+DEFAULT_ROW_COUNT = 1000000
+PROPS = ['stories_id', 'publish_date', 'title', 'url', 'language', 'ap_syndicated', 'inlink_count',
+         'facebook_share_count', 'subtopics', 'media_id', 'media_name', 'media_url']
+
+
+def sample_rows(count):
+    for i in range(count):
+        yield {
+            'stories_id': 100000000 + i, 'publish_date': '2020-01-01 12:34:56', 'title': 'A "story" title, number {}'.format(i),
+            'url': 'https://example.com/news/{}'.format(i), 'language': 'en', 'ap_syndicated': False,
+            'inlink_count': i % 17, 'facebook_share_count': None, 'subtopics': ['Set: One', 'Set: Two'],
+            'media_id': i % 5000, 'media_name': 'Example News', 'media_url': 'https://example.com',
+        }
+
+
+def _dict2row_stream(rows, props):
+    # the old approach, for comparison
+    yield ','.join(props) + '\n'
+    for r in rows:
+        yield ','.join(dict2row(props, r)) + '\n'
+
+
+def _time(name, generator):
+    start = time.time()
+    chunk_count = 0
+    char_count = 0
+    for chunk in generator:
+        chunk_count += 1
+        char_count += len(chunk)
+    secs = time.time() - start
+    print("  {:<18}{:>8.2f} secs{:>12} chunks{:>8.1f} MB/sec".format(name, secs, chunk_count,
+                                                                   char_count / secs / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROW_COUNT
+    print("{} rows".format(row_count))
+    _time('dict2row', _dict2row_stream(sample_rows(row_count), PROPS))
+    _time('stream_csv_chunks', stream_csv_chunks(sample_rows(row_count), PROPS))
@@ -0,0 +1,69 @@
+"""
+Time filling in missing dates on a 10 year daily split story count, like the ones we get for sources with a long
+history. This compares the current dict-based approach to the linear scan we used to do for every day.
+    python -m server.scripts.benchmark_date_gap_filling
+"""
+import datetime
+import random
+import timeit
+
+from server import mc
+from server.util.api_helper import add_missing_dates_to_split_story_counts, combined_split_and_normalized_counts
+
+YEARS = 10
+SPARSENESS = 0.8  # the fraction of days that have a count
+REPEATS = 5
+
+
+def _linear_scan_fill(counts, start, end):
+    # the old approach, for comparison
+    new_counts = []
+    current = start.date()
+    while current <= end.date():
+        date_string = current.strftime(mc.SENTENCE_PUBLISH_DATE_FORMAT)
+        existing_count = next((r for r in counts if r['date'] == date_string), None)
+        new_counts.append(existing_count if existing_count else {'date': date_string, 'count': 0})
+        current += datetime.timedelta(days=1)
+    return new_counts
+
+
+def _linear_scan_combine(matching_results, total_results):
+    # the old approach, for comparison (minus the date trimming, which both do)
+    counts = []
+    for day in total_results:
+        matching = [d for d in matching_results if d['date'] == day['date']]
+        counts.append({'date': day['date'], 'count': matching[0]['count'] if len(matching) > 0 else 0})
+    return counts
+
+
+def sample_counts(start, end):
+    counts = []
+    current = start
+    while current <= end:
+        if random.random() < SPARSENESS:
+            counts.append({'date': current.strftime(mc.SENTENCE_PUBLISH_DATE_FORMAT),
+                           'count': random.randint(1, 1000)})
+        current += datetime.timedelta(days=1)
+    return counts
+
+
+def run():
+    end = datetime.datetime(2020, 1, 1)
+    start = end - datetime.timedelta(days=365 * YEARS)
+    matching = sample_counts(start, end)
+    total = add_missing_dates_to_split_story_counts(sample_counts(start, end), start, end)
+    timings = {
+        'fill (dict)': timeit.timeit(lambda: add_missing_dates_to_split_story_counts(matching, start, end),
+                                     number=REPEATS),
+        'fill (linear scan)': timeit.timeit(lambda: _linear_scan_fill(matching, start, end), number=1) * REPEATS,
+        'combine (dict)': timeit.timeit(lambda: combined_split_and_normalized_counts(matching, total),
+                                        number=REPEATS),
+        'combine (linear scan)': timeit.timeit(lambda: _linear_scan_combine(matching, total), number=1) * REPEATS,
+    }
+    print("{} days, {} with counts".format(len(total), len(matching)))
+    for name, secs in timings.items():
+        print("  {:<24}{:>10.1f} ms".format(name, 1000 * secs / REPEATS))
+
+
+if __name__ == '__main__':
+    run()
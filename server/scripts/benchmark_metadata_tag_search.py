@@ -0,0 +1,56 @@
+"""
+Time searching the big geographic metadata tag sets (publication state and country), like the metadata pickers do on
+every keystroke. This compares the n-gram index to the linear scan over every label we used to do. Uses the
+`tags_in_{id}.json` files if they are there, or pages through the tag set from the API if not.
+    python -m server.scripts.benchmark_metadata_tag_search [tag_sets_id ...]
+"""
+import random
+import sys
+import timeit
+
+from server import TOOL_API_KEY
+from server.util.tags import TagSetDiscoverer, tag_set_with_tags
+from server.util.tagsearch import TagSearchIndex
+
+QUERIES = 200
+QUERY_LENGTHS = [1, 2, 3, 4, 6, 10]
+LIMIT = 100
+
+
+def _linear_scan(tags, search_string):
+    # the old approach, for comparison
+    return [t for t in tags if search_string.lower() in (t['label'] or t['tag']).lower()]
+
+
+def sample_queries(tags, length):
+    queries = []
+    for _ in range(QUERIES):
+        text = (random.choice(tags)['label'] or '').lower()
+        start = random.randint(0, max(0, len(text) - length))
+        queries.append(text[start:start + length] or 'a')
+    return queries
+
+
+def run(tag_sets_ids):
+    for tag_sets_id in tag_sets_ids:
+        tags = tag_set_with_tags(TOOL_API_KEY, tag_sets_id, False, True)['tags']
+        build_secs = timeit.timeit(lambda tags=tags: TagSearchIndex(tags), number=1)
+        index = TagSearchIndex(tags)
+        print("tag set {}: {} tags, index built in {:.1f} ms".format(tag_sets_id, len(tags), 1000 * build_secs))
+        for length in QUERY_LENGTHS:
+            queries = sample_queries(tags, length)
+            index_secs = timeit.timeit(lambda index=index, queries=queries: [index.search(q, LIMIT) for q in queries],
+                                       number=1)
+            scan_secs = timeit.timeit(lambda tags=tags, queries=queries: [_linear_scan(tags, q) for q in queries],
+                                      number=1)
+            print("  {:>2} chars: index {:>8.3f} ms, linear scan {:>8.3f} ms".format(
+                length, 1000 * index_secs / QUERIES, 1000 * scan_secs / QUERIES))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        ids = [int(i) for i in sys.argv[1:]]
+    else:
+        ids = [TagSetDiscoverer().media_pub_state_set, TagSetDiscoverer().media_pub_country_set,
+               TagSetDiscoverer().media_subject_country_set]
+    run(ids)
@@ -1,33 +1,48 @@
 # copied from http://flask.pocoo.org/snippets/75/
 
-import pickle
+import logging
 from datetime import timedelta
 from uuid import uuid4
 from redis import Redis
 from werkzeug.datastructures import CallbackDict
 from flask.sessions import SessionInterface, SessionMixin
 
+from server.util.serializer import CompactSerializer, SerializationError
+
+logger = logging.getLogger(__name__)
+
+# when a session hasn't changed we only push its expiry back once less than this much of its lifetime is left
+REFRESH_WHEN_REMAINING = 0.5
+
 
 class RedisSession(CallbackDict, SessionMixin):
 
-    def __init__(self, initial=None, sid=None, new=False):
+    def __init__(self, initial=None, sid=None, new=False, ttl=None):
         def on_update(self):
             self.modified = True
         CallbackDict.__init__(self, initial, on_update)
         self.sid = sid
         self.new = new
         self.modified = False
+        self.ttl = ttl  # seconds until it expires in redis, as of when it was loaded
 
 
 class RedisSessionInterface(SessionInterface):
-    serializer = pickle
+    # sessions only hold simple values, so they don't need pickle (which would run code from anyone who can write
+    # to the session redis)
+    serializer = CompactSerializer(allow_pickle=False)
     session_class = RedisSession
 
-    def __init__(self, redis=None, prefix='session:'):
+    def __init__(self, redis=None, prefix='session:', lazy_writes=True):
+        """
+        :param lazy_writes: only write the session back when it has changed, or to push back its expiry once it is
+                            getting close; otherwise it is rewritten on every response
+        """
         if redis is None:
             redis = Redis()
         self.redis = redis
         self.prefix = prefix
+        self.lazy_writes = lazy_writes
 
     def generate_sid(self):
         return str(uuid4())
@@ -45,28 +60,46 @@ class RedisSessionInterface(SessionInterface):
         if not sid:
             sid = self.generate_sid()
             return self.session_class(sid=sid, new=True)
-        val = self.redis.get(self.prefix + sid)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(self.prefix + sid)
+        pipe.ttl(self.prefix + sid)
+        val, ttl = pipe.execute()
         if val is not None:
-            data = self.serializer.loads(val)
-            return self.session_class(data, sid=sid)
+            try:
+                data = self.serializer.loads(val)
+                return self.session_class(data, sid=sid, ttl=ttl)
+            except SerializationError:
+                # ie. an old pickled session; they'll just have to log in again
+                logger.info("Ignoring a session in an unknown format")
         return self.session_class(sid=sid, new=True)
 
     def save_session(self, app, session, response):
         domain = self.get_cookie_domain(app)
         if not session:
-            self.redis.delete(self.prefix + session.sid)
+            if session.modified or not session.new:  # no need to delete a session that was never saved
+                self.redis.delete(self.prefix + session.sid)
             if session.modified:
                 response.delete_cookie(app.session_cookie_name,
                                        domain=domain)
             return
-        redis_exp = self.get_redis_expiration_time(app, session)
+        redis_exp = int(self._total_seconds(self.get_redis_expiration_time(app, session)))
         cookie_exp = self.get_expiration_time(app, session)
+        if self.lazy_writes and not (session.modified or session.new):
+            if (session.ttl is not None) and (session.ttl > redis_exp * REFRESH_WHEN_REMAINING):
+                return  # nothing changed, and it isn't close to expiring
+            # nothing changed, so just push back the expiry rather than rewriting it
+            if self.redis.expire(self.prefix + session.sid, redis_exp):
+                response.set_cookie(app.session_cookie_name, session.sid,
+                                    expires=cookie_exp, httponly=True,
+                                    domain=domain)
+                return
+            # it expired since we loaded it, so fall through and write it again
         val = self.serializer.dumps(dict(session))
         if isinstance(self.redis, Redis):
-            self.redis.setex(self.prefix + session.sid, val, int(self._total_seconds(redis_exp)))
+            self.redis.setex(self.prefix + session.sid, val, redis_exp)
         else:
             # StrictRedis has a different arg order than Redis
-            self.redis.setex(self.prefix + session.sid, int(self._total_seconds(redis_exp)), val)
+            self.redis.setex(self.prefix + session.sid, redis_exp, val)
         response.set_cookie(app.session_cookie_name, session.sid,
                             expires=cookie_exp, httponly=True,
                             domain=domain)
\ No newline at end of file
@@ -1,45 +1,62 @@
 import datetime
 from operator import itemgetter
+from dateutil.relativedelta import relativedelta
 
 from server import mc
 from server.util.stringutil import trim_solr_date
 
+# how far apart each bucket in a split story count is
+PERIOD_STEPS = {
+    'day': relativedelta(days=1),
+    'week': relativedelta(weeks=1),
+    'month': relativedelta(months=1),
+    'year': relativedelta(years=1),
+}
+
 
 def add_missing_dates_to_split_story_counts(counts, start, end, period="day"):
     if start is None and end is None:
         return counts
+    if period not in PERIOD_STEPS:
+        raise RuntimeError("Unsupport time period for filling in missing dates - {}".format(period))
+    counts_by_date = {r['date']: r for r in counts}
     new_counts = []
-    current = start.date()
-    while current <= end.date():
+    for current in _dates_in_range(start.date(), end.date(), period):
         date_string = current.strftime(mc.SENTENCE_PUBLISH_DATE_FORMAT)
-        existing_count = next((r for r in counts if r['date'] == date_string), None)
-        if existing_count:
-            new_counts.append(existing_count)
-        else:
-            new_counts.append({'date': date_string, 'count': 0})
-        if period == "day":
-            current += datetime.timedelta(days=1)
-        elif period == "month":
-            current += datetime.timedelta(months=1)
-        elif period == "year":
-            current += datetime.timedelta(years=1)
-        else:
-            raise RuntimeError("Unsupport time period for filling in missing dates - {}".format(period))
+        new_counts.append(counts_by_date.get(date_string) or {'date': date_string, 'count': 0})
     return new_counts
 
 
+def _period_start(date, period):
+    # the back-end buckets counts by calendar period, so line up with those (weeks start on Monday)
+    if period == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    if period == 'month':
+        return date.replace(day=1)
+    if period == 'year':
+        return date.replace(month=1, day=1)
+    return date
+
+
+def _dates_in_range(start, end, period):
+    step = PERIOD_STEPS[period]
+    if period in ['day', 'week']:
+        step = datetime.timedelta(days=step.days)  # fixed-length steps are much faster to add on as a timedelta
+    current = _period_start(start, period)
+    while current <= end:
+        yield current
+        current += step
+
+
 def combined_split_and_normalized_counts(matching_results, total_results):
     counts = []
+    matching_by_date = {d['date']: d['count'] for d in matching_results}
     for day in total_results:
         day_info = {
             'date': trim_solr_date(day['date']),
-            'total_count': day['count']
+            'total_count': day['count'],
+            'count': matching_by_date.get(day['date'], 0),
         }
-        matching = [d for d in matching_results if d['date'] == day['date']]
-        if len(matching) == 0:
-            day_info['count'] = 0
-        else:
-            day_info['count'] = matching[0]['count']
         if day_info['count'] == 0 or day['count'] == 0:
             day_info['ratio'] = 0
         else:
@@ -1,12 +1,13 @@
-import requests
 from typing import List, Dict
 
 from server import config
 from server.cache import cache
+import server.util.http_client as http_client
 
 
 CORENLP_URL = config.get('CORENLP_URL')
 SNIPPET_WINDOW_SIZE = 150  # how many chars before or after the quote to save for context into the DB
+CORENLP_TIMEOUT = (3.05, 120)  # annotating a long story with all these annotators can take a while
 
 
 def quotes_from_text(text: str) -> List[Dict]:
@@ -18,7 +19,7 @@ def quotes_from_text(text: str) -> List[Dict]:
 @cache.cache_on_arguments()
 def _fetch_annotations(text: str) -> Dict:
     url = 'http://' + CORENLP_URL + '/?properties={"annotators":"tokenize,ssplit,pos,lemma,ner,depparse,coref,quote","outputFormat":"json"}'
-    r = requests.post(url, data=text.encode('utf-8'))
+    r = http_client.post(url, data=text.encode('utf-8'), upstream='corenlp', timeout=CORENLP_TIMEOUT)
     return r.json()
 
 
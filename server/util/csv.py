@@ -1,11 +1,15 @@
 import logging
 import datetime
+import io
+import csv as stdlib_csv
 import flask
 
 from server.util.tags import label_for_metadata_tag
 
 SOURCE_LIST_CSV_METADATA_PROPS = ['pub_country', 'pub_state', 'language', 'about_country', 'media_type']
 
+CSV_CHUNK_SIZE = 64 * 1024  # roughly how many characters to send to the client at a time when streaming
+
 logger = logging.getLogger(__name__)
 
 
@@ -42,6 +46,42 @@ def dict2row(keys_to_include, dict_row):
     return attributes
 
 
+def _column_getter(key):
+    def getter(dict_row):
+        value = dict_row.get(key, '')  # allow download even if col missing for this row
+        if isinstance(value, list):
+            return ", ".join(value)
+        return value
+    return getter
+
+
+def stream_csv_chunks(dict_rows, dict_keys, column_names=None, chunk_size=CSV_CHUNK_SIZE):
+    """Generator that turns dicts into csv text, yielding it in chunks of about chunk_size characters (rather than
+    one tiny string per row). The header row is sent right away so the download starts. Every value is quoted, to
+    match dict2row.
+    Keyword arguments:
+    dict_rows -- an iterable of dicts (this can be a generator, so you can stream pages of results through it)
+    dict_keys -- the keys in each dict to build the csv out of (order is preserved)
+    column_names -- (optional) column names to use, defaults to dict_keys if not specified
+    """
+    yield ','.join(column_names or dict_keys) + '\n'
+    getters = [_column_getter(k) for k in dict_keys]
+    buffer = io.StringIO()
+    writer = stdlib_csv.writer(buffer, quoting=stdlib_csv.QUOTE_ALL, lineterminator='\n')
+    for dict_row in dict_rows:
+        try:
+            writer.writerow([get(dict_row) for get in getters])
+        except Exception:
+            # fall back to the slow cell-by-cell version, which logs and marks the values it can't handle
+            buffer.write(','.join(dict2row(dict_keys, dict_row)) + '\n')
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell() > 0:
+        yield buffer.getvalue()
+
+
 def stream_response(data, dict_keys, filename, column_names=None, as_attachment=True):
     """Stream a fully ready dict to the user as a csv.
     Keyword arguments:
@@ -59,19 +99,13 @@ def stream_response(data, dict_keys, filename, column_names=None, as_attachment=
     logger.debug("  cols: "+' '.join(column_names))
     logger.debug("  props: "+' '.join(dict_keys))
 
-    # stream back a csv
-    def stream_as_csv(dataset, props, names):
-        yield ','.join(names) + '\n'
-        for dict_row in dataset:
-            cleaned_row = dict2row(props, dict_row)
-            yield ','.join(cleaned_row) + '\n'
     download_filename = safe_filename(filename)
     headers = {}
     if as_attachment:
         headers["Content-Disposition"] = "attachment;filename="+download_filename
 
     if not len(data) == 0:
-        return flask.Response(stream_as_csv(data, dict_keys, column_names),
+        return flask.Response(stream_csv_chunks(data, dict_keys, column_names),
                               mimetype='text/csv; charset=utf-8', headers=headers)
     else:
         dict_keys = ','.join(dict_keys) + '\n'
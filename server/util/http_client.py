@@ -0,0 +1,149 @@
+"""
+One place for all the HTTP calls we make to side services (word embeddings, CoreNLP, the theme labeller, and the
+platform APIs). Every call gets connect/read timeouts, a few retries with jittered backoff, and reuses keep-alive
+connections from a pooled session for its host. Each upstream also has a circuit breaker, so when a service is down
+we fail fast instead of tying up all the executor workers waiting on it.
+"""
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+import requests.adapters
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = (3.05, 30)    # (connect, read) in seconds
+DEFAULT_RETRIES = 2             # on top of the first try
+BACKOFF_BASE_SECS = 0.25
+BACKOFF_MAX_SECS = 4
+RETRY_STATUS_CODES = frozenset([429, 502, 503, 504])
+POOL_CONNECTIONS = 20           # how many keep-alive connections to keep open per host
+
+BREAKER_FAILURE_THRESHOLD = 5   # consecutive failures before we stop calling an upstream
+BREAKER_RESET_SECS = 30         # how long to wait before letting a trial call through
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of making a call to an upstream that has been failing. This is a kind of `RequestException`, so
+    code that already handles connection problems handles this too.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While it is open calls fail right away; after `reset_secs`
+    one trial call is let through, and it closes again if that works.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_secs=BREAKER_RESET_SECS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_secs = reset_secs
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_progress or (time.time() - self._opened_at < self.reset_secs):
+                return False
+            self._trial_in_progress = True  # half-open: let just this one call through
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Circuit to {} closed again".format(self.name))
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_progress or (self._opened_at is None and self._failures >= self.failure_threshold):
+                if self._opened_at is None:
+                    logger.warning("Circuit to {} opened after {} failures".format(self.name, self._failures))
+                self._opened_at = time.time()
+            self._trial_in_progress = False
+
+
+_sessions = {}
+_breakers = {}
+_lock = threading.Lock()
+
+
+def _session_for(host):
+    with _lock:
+        if host not in _sessions:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=POOL_CONNECTIONS)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return _sessions[host]
+
+
+def _breaker_for(upstream):
+    with _lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker(upstream)
+        return _breakers[upstream]
+
+
+def _backoff_secs(attempt):
+    # "full jitter" - so a bunch of workers retrying at once don't all hit the upstream at the same moment
+    return random.uniform(0, min(BACKOFF_MAX_SECS, BACKOFF_BASE_SECS * (2 ** attempt)))
+
+
+def request(method, url, upstream=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, **kwargs):
+    """
+    Make an HTTP request to a side service. Takes the same keyword arguments as `requests.request`.
+    :param upstream: name of the service, for the circuit breaker (defaults to the host in the url)
+    :param retries: how many times to retry after a connection error (including timing out while connecting) or a
+    429/502/503/504 response. Read timeouts aren't retried - the upstream already spent the whole read timeout on the
+    call, and retrying would multiply how long our caller waits (and repeat work that may have gone through).
+    :return: the `requests.Response` (which could still be an error status, same as using requests directly)
+    """
+    host = urlparse(url).netloc
+    breaker = _breaker_for(upstream or host)
+    session = _session_for(host)
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError("Not calling {} because it has been failing".format(breaker.name))
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.ReadTimeout:
+            breaker.record_failure()
+            raise
+        except requests.exceptions.ConnectionError as e:  # includes ConnectTimeout, so the request never got there
+            breaker.record_failure()
+            if attempt >= retries:
+                raise e
+            logger.info("Retrying {} {} after {}".format(method, url, e))
+        else:
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if (response.status_code not in RETRY_STATUS_CODES) or (attempt >= retries):
+                return response
+            logger.info("Retrying {} {} after a {} response".format(method, url, response.status_code))
+        time.sleep(_backoff_secs(attempt))
+        attempt += 1
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
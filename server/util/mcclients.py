@@ -0,0 +1,158 @@
+"""
+A pool of Media Cloud API clients, so we don't build a new one (with a new HTTP connection) for every call. Clients
+are kept per api key and client type in a bounded LRU, and they all share one `requests.Session`, so calls to the
+back-end reuse open keep-alive connections instead of doing a new TCP/TLS handshake each time.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+import requests
+import requests.adapters
+import mediacloud.api
+import mediacloud.error
+
+logger = logging.getLogger(__name__)
+
+CLIENT_USER = 'user'
+CLIENT_ADMIN = 'admin'
+
+DEFAULT_MAX_CLIENTS = 1000
+DEFAULT_CONNECTIONS = 50
+
+_JSON_HEADERS = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+_ACCEPT_HEADERS = {'Accept': 'application/json'}
+
+
+class _SessionQueryMixin:
+    """
+    The mediacloud library sends everything through the module-level `requests` functions, which open a new connection
+    each time. This is a copy of its `_query` that sends the requests through a shared session instead.
+    """
+
+    def __init__(self, *args, session=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._session = session if session is not None else requests.Session()
+
+    def _query(self, url, params=None, http_method='GET', json_data=None):
+        start_time = time.time()
+        if params is None:
+            params = {}
+        if ('key' not in params) and (http_method != 'POST_JSON'):
+            params['key'] = self._auth_token
+        if self._all_fields:
+            params['all_fields'] = 1
+        try:
+            if http_method == 'GET':
+                # automatically switch to POST if request too long
+                if self._url_length(url, params) > mediacloud.api.MAX_HTTP_GET_CHARS:
+                    r = self._session.post(url, data=params, headers=_ACCEPT_HEADERS)
+                else:
+                    r = self._session.get(url, params=params, headers=_ACCEPT_HEADERS)
+            elif http_method == 'PUT_JSON':
+                # the json to send could be an array (not a dict), so the params and json go separately
+                if json_data is None:
+                    params_to_send = {'key': self._auth_token}
+                    data_to_send = params
+                else:
+                    params_to_send = params
+                    data_to_send = json_data
+                r = self._session.put(url, params=params_to_send, data=json.dumps(data_to_send), headers=_JSON_HEADERS)
+            elif http_method == 'PUT':
+                r = self._session.put(url, params=params, headers=_ACCEPT_HEADERS)
+            elif http_method == 'POST_JSON':  # posts JSON data, needs key in url
+                r = self._session.post(url + "?key=" + self._auth_token, data=json.dumps(params),
+                                       headers=_JSON_HEADERS)
+            elif http_method == 'POST':  # post Form data
+                r = self._session.post(url + "?key=" + self._auth_token, params, headers=_ACCEPT_HEADERS)
+            else:
+                raise ValueError('Error - unsupported HTTP method {}'.format(http_method))
+        except requests.exceptions.RequestException as e:
+            logger.error('Failed to {} to {} because {}'.format(http_method, url, e))
+            raise e
+        logger.debug("Profiling: {}s for {} to {}".format(time.time() - start_time, http_method, url))
+        if r.status_code != requests.codes['ok']:
+            logger.info('Bad HTTP response to {}: {} {}'.format(r.url, r.status_code, r.reason))
+            msg = 'Error - got a HTTP status code of {} with the message "{}", body: {}'.format(r.status_code,
+                                                                                                 r.reason, r.text)
+            raise mediacloud.error.MCException(msg, r.status_code)
+        return r
+
+
+class PooledMediaCloud(_SessionQueryMixin, mediacloud.api.MediaCloud):
+    pass
+
+
+class PooledAdminMediaCloud(_SessionQueryMixin, mediacloud.api.AdminMediaCloud):
+    pass
+
+
+_CLIENT_CLASSES = {
+    CLIENT_USER: PooledMediaCloud,
+    CLIENT_ADMIN: PooledAdminMediaCloud,
+}
+
+
+class MediaCloudClientPool:
+    """
+    Thread-safe LRU of Media Cloud clients, keyed by client type and api key. The clients are stateless apart from
+    their key and the shared session, so the same one can be used by many requests (and executor jobs) at once.
+    """
+
+    def __init__(self, api_url=None, max_clients=DEFAULT_MAX_CLIENTS, connections=DEFAULT_CONNECTIONS):
+        self.api_url = api_url
+        self.max_clients = max_clients
+        self.session = requests.Session()
+        # one connection pool per host, each holding up to `connections` open keep-alive connections
+        adapter = requests.adapters.HTTPAdapter(pool_connections=connections, pool_maxsize=connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def user_client(self, api_key):
+        return self.get(CLIENT_USER, api_key)
+
+    def admin_client(self, api_key):
+        return self.get(CLIENT_ADMIN, api_key)
+
+    def get(self, client_type, api_key):
+        key = (client_type, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self._counts['hits'] += 1
+                return client
+            self._counts['misses'] += 1
+        client = self._build(client_type, api_key)  # outside the lock; this raises if the key is empty
+        with self._lock:
+            client = self._clients.setdefault(key, client)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self._counts['evictions'] += 1
+        return client
+
+    def _build(self, client_type, api_key):
+        client = _CLIENT_CLASSES[client_type](api_key, session=self.session)
+        if self.api_url is not None:
+            client.V2_API_URL = self.api_url
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counts['hits'] + self._counts['misses']
+            stats = dict(self._counts)
+            stats.update({
+                'clients': len(self._clients),
+                'max_clients': self.max_clients,
+                'hit_rate': float(self._counts['hits']) / lookups if lookups > 0 else None,
+            })
+            return stats
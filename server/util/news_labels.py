@@ -2,6 +2,7 @@ import requests
 import logging
 
 from server import config
+import server.util.http_client as http_client
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +12,7 @@ def predict(story_text):
         return {}
     url = "{}/predict.json".format(config.get('NYT_THEME_LABELLER_URL'))
     try:
-        r = requests.post(url, json={'text': story_text})
+        r = http_client.post(url, json={'text': story_text}, upstream='news-labels')
         return r.json()
     except requests.exceptions.RequestException as e:
         logger.exception(e)
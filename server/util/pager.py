@@ -0,0 +1,69 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH_PAGES = 2   # how many pages can be waiting before the background fetcher blocks
+_POLL_SECS = 0.5
+
+
+class _FetchError:
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+_DONE = object()
+
+
+def prefetching_pages(fetch_page, first_cursor, next_cursor, max_waiting_pages=DEFAULT_PREFETCH_PAGES):
+    """
+    Generator that pages through results, fetching the next page in a background thread while you work on the current
+    one (ie. turning it into csv rows). This overlaps network time with processing time on big downloads. The queue
+    between the two is bounded, so the fetcher waits if you fall behind. If you stop early (or the client goes away)
+    the fetcher is told to stop too.
+    :param fetch_page: function that takes a cursor and returns a page of results
+    :param first_cursor: the cursor for the first page (ie. a link_id or a last_processed_stories_id); can be None
+    :param next_cursor: function that takes a page and returns the cursor for the next one, or None if it was the last
+    :return: each page, in order
+    """
+    pages = queue.Queue(maxsize=max_waiting_pages)
+    stopped = threading.Event()
+
+    def _put(item):
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=_POLL_SECS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch_all():
+        cursor = first_cursor
+        try:
+            while True:
+                page = fetch_page(cursor)
+                if not _put(page):
+                    return
+                cursor = next_cursor(page)
+                if cursor is None:
+                    break
+        except Exception as e:
+            _put(_FetchError(e))
+            return
+        _put(_DONE)
+
+    fetcher = threading.Thread(target=_fetch_all, name="prefetching-pager", daemon=True)
+    fetcher.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _FetchError):
+                raise item.exception
+            yield item
+    finally:
+        stopped.set()
@@ -0,0 +1,114 @@
+"""
+Compact serialization for things we store in Redis. Results from the back-end API are all JSON-like, so msgpack
+handles them in a fraction of the space pickle uses, and big payloads are compressed on top of that.
+Every value is written with a small header saying how it was encoded, so you can change the settings without
+flushing Redis. Values without the header are assumed to be old pickles.
+"""
+import logging
+import pickle
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_PICKLE = 'pickle'
+FORMAT_MSGPACK = 'msgpack'
+
+COMPRESSION_NONE = 'none'
+COMPRESSION_ZLIB = 'zlib'
+COMPRESSION_LZ4 = 'lz4'
+
+HEADER_MAGIC = b'mc'
+_FORMAT_CODES = {FORMAT_PICKLE: b'p', FORMAT_MSGPACK: b'm'}
+_COMPRESSION_CODES = {COMPRESSION_NONE: b'-', COMPRESSION_ZLIB: b'z', COMPRESSION_LZ4: b'l'}
+_FORMATS_BY_CODE = {v: k for k, v in _FORMAT_CODES.items()}
+_COMPRESSIONS_BY_CODE = {v: k for k, v in _COMPRESSION_CODES.items()}
+HEADER_LENGTH = len(HEADER_MAGIC) + 2
+
+
+class SerializationError(Exception):
+    pass
+
+
+class CompactSerializer:
+    """
+    Encode values as msgpack (or pickle), compressing anything bigger than `compress_threshold` bytes. If
+    `allow_pickle` is True, values msgpack can't handle (ie. datetimes) fall back to pickle; turn it off for
+    anything that reads data a user could have influenced.
+    """
+
+    def __init__(self, data_format=FORMAT_MSGPACK, compression=COMPRESSION_ZLIB, compress_threshold=1024,
+                 allow_pickle=True):
+        if data_format not in _FORMAT_CODES:
+            raise ValueError("Unknown serialization format '{}'".format(data_format))
+        if compression not in _COMPRESSION_CODES:
+            raise ValueError("Unknown compression '{}'".format(compression))
+        if (data_format == FORMAT_MSGPACK) and (msgpack is None):
+            logger.warning("msgpack isn't installed, falling back to pickle")
+            data_format = FORMAT_PICKLE
+        if (compression == COMPRESSION_LZ4) and (lz4 is None):
+            logger.warning("lz4 isn't installed, falling back to zlib compression")
+            compression = COMPRESSION_ZLIB
+        if (data_format == FORMAT_PICKLE) and not allow_pickle:
+            raise ValueError("Can't use the pickle format when pickle isn't allowed")
+        self.data_format = data_format
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.allow_pickle = allow_pickle
+
+    def dumps(self, value):
+        data_format = self.data_format
+        if data_format == FORMAT_MSGPACK:
+            try:
+                body = msgpack.packb(value, use_bin_type=True)
+            except (TypeError, ValueError, OverflowError) as e:
+                if not self.allow_pickle:
+                    raise SerializationError("Can't serialize a {} without pickle".format(type(value))) from e
+                data_format = FORMAT_PICKLE
+        if data_format == FORMAT_PICKLE:
+            body = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        compression = COMPRESSION_NONE
+        if len(body) > self.compress_threshold:
+            compression = self.compression
+            body = _compress(compression, body)
+        return HEADER_MAGIC + _FORMAT_CODES[data_format] + _COMPRESSION_CODES[compression] + body
+
+    def loads(self, data):
+        if not data.startswith(HEADER_MAGIC):
+            if not self.allow_pickle:
+                raise SerializationError("Refusing to unpickle a value without a header")
+            return pickle.loads(data)   # written before we added this serializer
+        data_format = _FORMATS_BY_CODE[data[2:3]]
+        compression = _COMPRESSIONS_BY_CODE[data[3:4]]
+        body = _decompress(compression, data[HEADER_LENGTH:])
+        if data_format == FORMAT_MSGPACK:
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        if not self.allow_pickle:
+            raise SerializationError("Refusing to unpickle a value")
+        return pickle.loads(body)
+
+
+def _compress(compression, body):
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(body, 1)  # the fastest level still gets most of the savings on JSON-like data
+    if compression == COMPRESSION_LZ4:
+        return lz4.frame.compress(body)
+    return body
+
+
+def _decompress(compression, body):
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(body)
+    if compression == COMPRESSION_LZ4:
+        if lz4 is None:
+            raise SerializationError("Can't read an lz4 compressed value because lz4 isn't installed")
+        return lz4.frame.decompress(body)
+    return body
@@ -0,0 +1,120 @@
+"""
+A read-only, in-process store of the "static" tag sets we keep on disk as `tags_in_{id}.json` files (the media
+metadata tag sets mostly). The files are parsed once when the app starts and then served from memory, instead of
+being round-tripped through Redis on every lookup. If a file changes (ie. someone re-ran
+`server/scripts/gen_tags_in_tag_set_json.py`) it is reloaded on the next lookup.
+"""
+import codecs
+import glob
+import json
+import logging
+import os
+import threading
+
+from server.util.tagsearch import TagSearchIndex
+
+logger = logging.getLogger(__name__)
+
+FILE_NAME_TEMPLATE = "tags_in_{}.json"
+
+
+def tag_ids_by_name(tags):
+    """
+    :return: a dict from each tag's name (the `tag` property) to its tags_id
+    """
+    return {t['tag']: t['tags_id'] for t in tags}
+
+
+class _Entry:
+
+    def __init__(self, modified, tag_set):
+        self.modified = modified
+        self.tag_set = tag_set
+        self._search_index = None
+        self._tag_ids_by_name = None
+
+    @property
+    def search_index(self):
+        if self._search_index is None:
+            self._search_index = TagSearchIndex(self.tag_set['tags'])  # a harmless race if two threads build it
+        return self._search_index
+
+    @property
+    def tag_ids_by_name(self):
+        if self._tag_ids_by_name is None:
+            self._tag_ids_by_name = tag_ids_by_name(self.tag_set['tags'])
+        return self._tag_ids_by_name
+
+
+class StaticTagSetStore:
+    """
+    Holds the parsed tag set files, keyed by tag_sets_id. Each lookup checks the file's modified time (a cheap `stat`),
+    so updated files are picked up without a restart. If gunicorn is started with `--preload` the loaded sets are
+    shared copy-on-write between the forked workers.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def file_path(self, tag_sets_id):
+        return os.path.join(self.data_dir, FILE_NAME_TEMPLATE.format(tag_sets_id))
+
+    def preload(self):
+        for file_path in glob.glob(os.path.join(self.data_dir, FILE_NAME_TEMPLATE.format('*'))):
+            tag_sets_id = os.path.basename(file_path)[len('tags_in_'):-len('.json')]
+            try:
+                self._entry(tag_sets_id)
+            except ValueError as e:
+                logger.warning("Couldn't load static tag set {}: {}".format(file_path, e))
+        logger.info("Loaded {} static tag sets".format(len(self._entries)))
+
+    def _entry(self, tag_sets_id):
+        tag_sets_id = str(tag_sets_id)
+        file_path = self.file_path(tag_sets_id)
+        try:
+            modified = os.path.getmtime(file_path)
+        except OSError:
+            return None  # there isn't a file for this tag set
+        with self._lock:
+            entry = self._entries.get(tag_sets_id)
+        if (entry is not None) and (entry.modified == modified):
+            return entry
+        with codecs.open(file_path, 'r', 'utf-8') as json_data:
+            entry = _Entry(modified, json.load(json_data))
+        with self._lock:
+            self._entries[tag_sets_id] = entry
+        logger.debug("Loaded {} tags from {}".format(len(entry.tag_set['tags']), file_path))
+        return entry
+
+    def has(self, tag_sets_id):
+        return self._entry(tag_sets_id) is not None
+
+    def tag_set(self, tag_sets_id):
+        """
+        :return: the tag set with all its `tags`, or None if there is no file for it. This is a copy, so callers can
+        change it (add properties to the tags, etc.) without affecting anyone else.
+        """
+        entry = self._entry(tag_sets_id)
+        if entry is None:
+            return None
+        tag_set = dict(entry.tag_set)
+        tag_set['tags'] = [dict(t) for t in entry.tag_set['tags']]
+        return tag_set
+
+    def search_index(self, tag_sets_id):
+        """
+        :return: a `TagSearchIndex` over the tags in the set (built the first time it is asked for), or None if there is
+        no file for it
+        """
+        entry = self._entry(tag_sets_id)
+        return None if entry is None else entry.search_index
+
+    def tag_ids_by_name(self, tag_sets_id):
+        """
+        :return: a dict from tag name to tags_id for the set (built the first time it is asked for), or None if there
+        is no file for it. Don't change it - it is shared.
+        """
+        entry = self._entry(tag_sets_id)
+        return None if entry is None else entry.tag_ids_by_name
@@ -5,6 +5,7 @@ import re
 logger = logging.getLogger(__name__)
 
 UNDERSCORE_REG = r"(.*?)_([a-zA-Z])"
+SOLR_DATE_PREFIX = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[ T]|$)')
 
 def ids_from_comma_separated_str(comma_separated_string):
     id_list = []
@@ -14,6 +15,8 @@ def ids_from_comma_separated_str(comma_separated_string):
 
 
 def trim_solr_date(date_str):
+    if SOLR_DATE_PREFIX.match(date_str):
+        return date_str[:10]    # much faster than parsing, and this is called for every day in a split count
     return dateutil.parser.parse(date_str).strftime("%Y-%m-%d")
 
 
@@ -4,13 +4,16 @@ import logging
 import os
 from operator import itemgetter
 import json
-import codecs
+import threading
+import time
 
 from server import base_dir, mc, TOOL_API_KEY
 from server.auth import user_mediacloud_client
 from server.cache import cache
 from server.util.stringutil import snake_to_camel
 from server.util.config import get_default_config
+from server.util.tagsearch import TagSearchIndex
+from server.util.static_tag_sets import StaticTagSetStore, tag_ids_by_name
 
 logger = logging.getLogger(__name__)
 
@@ -308,6 +311,10 @@ def label_for_metadata_tag(tag):
 
 static_tag_set_cache_dir = os.path.join(base_dir, 'server', 'static', 'data')
 
+# the tag sets that don't change get read off disk once, when the app starts
+static_tag_sets = StaticTagSetStore(static_tag_set_cache_dir)
+static_tag_sets.preload()
+
 
 def tags_in_tag_set(mc_api_key, tag_sets_id):
     return tag_set_with_tags(mc_api_key, tag_sets_id, False, True)['tags']
@@ -317,10 +324,9 @@ def tag_set_with_tags(mc_api_key, tag_sets_id, only_public_tags=False, use_file_
     # don't need to cache here, because either you are reading from a file, or each page is cached
     local_mc = user_mediacloud_client(mc_api_key)
     if use_file_cache:
-        file_name = "tags_in_{}.json".format(tag_sets_id)
-        file_path = os.path.join(static_tag_set_cache_dir, file_name)
-        if os.path.isfile(file_path):
-            return cached_tag_set_file(file_path)   # more caching!
+        tag_set = static_tag_sets.tag_set(tag_sets_id)
+        if tag_set is not None:
+            return tag_set
     tag_set = local_mc.tagSet(tag_sets_id)
     # page through tags
     more_tags = True
@@ -354,12 +360,45 @@ def _cached_tag_page(mc_api_key, tag_sets_id, last_tags_id, rows, public_only):
     return tag_list
 
 
-@cache.cache_on_arguments()
-def cached_tag_set_file(file_path):
-    # hold the file in memory to reduce reads
-    with codecs.open(file_path, 'r', 'utf-8') as json_data:
-        data = json.load(json_data)
-        return data
+def tag_ids_by_name_in_tag_set(mc_api_key, tag_sets_id):
+    """
+    A lookup from tag name to tags_id for all the tags in a tag set, for matching up the tag names people use (ie. in
+    source upload CSVs). This is built once per process for the static tag sets.
+    """
+    lookup = static_tag_sets.tag_ids_by_name(tag_sets_id)
+    if lookup is None:
+        lookup = tag_ids_by_name(tag_set_with_tags(mc_api_key, tag_sets_id)['tags'])
+    return lookup
+
+
+DYNAMIC_SEARCH_INDEX_TTL_SECS = 5 * 60   # tags can be added to the sets we don't have files for, so rebuild these
+DYNAMIC_SEARCH_INDEX_MAX_SETS = 50
+
+_dynamic_search_indexes = {}  # tag_sets_id => (expires at, index)
+_dynamic_search_indexes_lock = threading.Lock()
+
+
+def tag_set_search_index(mc_api_key, tag_sets_id):
+    """
+    A search index over all the tags in a tag set. For the static tag sets with a `tags_in_{id}.json` file the index is
+    built once per process (and rebuilt if the file changes); for others we build one from the API results and keep it
+    for a few minutes, so people typing into a search box don't rebuild it on every keystroke.
+    """
+    index = static_tag_sets.search_index(tag_sets_id)
+    if index is not None:
+        return index
+    tag_sets_id = str(tag_sets_id)
+    with _dynamic_search_indexes_lock:
+        cached = _dynamic_search_indexes.get(tag_sets_id)
+    if (cached is not None) and (cached[0] > time.time()):
+        return cached[1]
+    index = TagSearchIndex(tag_set_with_tags(mc_api_key, tag_sets_id)['tags'])
+    with _dynamic_search_indexes_lock:
+        _dynamic_search_indexes.pop(tag_sets_id, None)
+        while len(_dynamic_search_indexes) >= DYNAMIC_SEARCH_INDEX_MAX_SETS:
+            del _dynamic_search_indexes[next(iter(_dynamic_search_indexes))]  # the one built longest ago
+        _dynamic_search_indexes[tag_sets_id] = (time.time() + DYNAMIC_SEARCH_INDEX_TTL_SECS, index)
+    return index
 
 
 def media_with_tag(tags_id, cached=False):
@@ -0,0 +1,103 @@
+"""
+In-memory search over the labels of all the tags in a tag set. We build one of these when a static tag set file
+(`tags_in_{id}.json`) is loaded, so the metadata pickers can search thousands of geographic tags on every keystroke
+without scanning the whole list each time.
+"""
+import heapq
+
+MAX_GRAM_SIZE = 3   # index every 1, 2 and 3 character substring of each label
+
+# how well a label matches the search string, best first
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_SUBSTRING = 3
+
+
+def _normalize(text):
+    return text.lower() if text else ''
+
+
+def _tag_search_text(tag):
+    # some tags don't have a label, so fall back to the tag itself (same as the sort order in the files)
+    return _normalize(tag.get('label') or tag.get('tag'))
+
+
+def _grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _is_word_start(text, position):
+    return position == 0 or not text[position - 1].isalnum()
+
+
+class TagSearchIndex:
+    """
+    An n-gram inverted index over tag labels. Every 1-3 character substring of a label points at the tags that contain
+    it, so a search only has to check the handful of tags that share all the search string's trigrams. Matches are the
+    same as a case-insensitive substring search, ranked exact > prefix > word prefix > anywhere in the label.
+    """
+
+    def __init__(self, tags):
+        self.tags = list(tags)
+        self._texts = [_tag_search_text(t) for t in self.tags]
+        self._postings = {}
+        for idx, text in enumerate(self._texts):
+            for size in range(1, MAX_GRAM_SIZE + 1):
+                for gram in _grams(text, size):
+                    self._postings.setdefault(gram, []).append(idx)
+        self._ranked_short_queries = {}  # one and two character queries match lots of tags, so remember the ranking
+
+    def __len__(self):
+        return len(self.tags)
+
+    def _candidates(self, query):
+        if len(query) <= MAX_GRAM_SIZE:
+            return self._postings.get(query, [])  # short strings are indexed directly, so these all match
+        postings = sorted((self._postings.get(g, []) for g in _grams(query, MAX_GRAM_SIZE)), key=len)
+        if len(postings[0]) == 0:
+            return []
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates.intersection_update(p)
+            if not candidates:
+                break
+        # sharing all the trigrams doesn't guarantee they're in the right order, so double check
+        return [idx for idx in candidates if query in self._texts[idx]]
+
+    def _rank(self, idx, query):
+        text = self._texts[idx]
+        if text == query:
+            return RANK_EXACT
+        position = text.find(query)
+        if position == 0:
+            return RANK_PREFIX
+        while position != -1:
+            if _is_word_start(text, position):
+                return RANK_WORD_PREFIX
+            position = text.find(query, position + 1)
+        return RANK_SUBSTRING
+
+    def search(self, search_string, limit=None):
+        """
+        :param search_string: text to look for anywhere in the tag labels (case-insensitive)
+        :param limit: the most results to return, or None for all of them
+        :return: the matching tags, best matches first (and in their original order within each rank)
+        """
+        query = _normalize(search_string)
+        if len(query) == 0:
+            return []
+        if len(query) < MAX_GRAM_SIZE:
+            best = self._ranked_short_queries.get(query)
+            if best is None:
+                best = self._ranked(query, None)
+                self._ranked_short_queries[query] = best
+            best = best if limit is None else best[:limit]
+        else:
+            best = self._ranked(query, limit)
+        return [self.tags[idx] for idx in best]
+
+    def _ranked(self, query, limit):
+        ranked = ((self._rank(idx, query), idx) for idx in self._candidates(query))
+        best = sorted(ranked) if limit is None else heapq.nsmallest(limit, ranked)
+        return [idx for _, idx in best]
@@ -0,0 +1,62 @@
+import datetime
+import unittest
+
+from server.util.api_helper import add_missing_dates_to_split_story_counts, combined_split_and_normalized_counts
+
+
+class AddMissingDatesTest(unittest.TestCase):
+
+    def testFillsInDays(self):
+        counts = [{'date': '2020-01-02 00:00:00', 'count': 5}]
+        results = add_missing_dates_to_split_story_counts(counts, datetime.datetime(2020, 1, 1),
+                                                          datetime.datetime(2020, 1, 4))
+        assert [r['date'] for r in results] == ['2020-01-01 00:00:00', '2020-01-02 00:00:00',
+                                                '2020-01-03 00:00:00', '2020-01-04 00:00:00']
+        assert [r['count'] for r in results] == [0, 5, 0, 0]
+
+    def testWeeks(self):
+        counts = [{'date': '2020-01-13 00:00:00', 'count': 3}]
+        results = add_missing_dates_to_split_story_counts(counts, datetime.datetime(2020, 1, 1),
+                                                          datetime.datetime(2020, 1, 31), period="week")
+        # weekly buckets start on Mondays, so the first one starts before the 1st
+        assert [r['date'][:10] for r in results] == ['2019-12-30', '2020-01-06', '2020-01-13', '2020-01-20',
+                                                     '2020-01-27']
+        assert results[2]['count'] == 3
+
+    def testMonthsStartOnTheFirst(self):
+        counts = [{'date': '2020-03-01 00:00:00', 'count': 2}]
+        results = add_missing_dates_to_split_story_counts(counts, datetime.datetime(2020, 1, 31),
+                                                          datetime.datetime(2020, 4, 30), period="month")
+        assert [r['date'][:10] for r in results] == ['2020-01-01', '2020-02-01', '2020-03-01', '2020-04-01']
+        assert [r['count'] for r in results] == [0, 0, 2, 0]
+
+    def testYears(self):
+        counts = [{'date': '2012-01-01 00:00:00', 'count': 7}]
+        results = add_missing_dates_to_split_story_counts(counts, datetime.datetime(2010, 6, 15),
+                                                          datetime.datetime(2019, 12, 31), period="year")
+        assert len(results) == 10
+        assert results[0]['date'][:10] == '2010-01-01'
+        assert results[2]['count'] == 7
+
+    def testUnknownPeriod(self):
+        with self.assertRaises(RuntimeError):
+            add_missing_dates_to_split_story_counts([], datetime.datetime(2020, 1, 1),
+                                                    datetime.datetime(2020, 1, 4), period="fortnight")
+
+    def testNoDates(self):
+        counts = [{'date': '2020-01-02 00:00:00', 'count': 5}]
+        assert add_missing_dates_to_split_story_counts(counts, None, None) == counts
+
+
+class CombinedSplitAndNormalizedCountsTest(unittest.TestCase):
+
+    def testCombines(self):
+        matching = [{'date': '2020-01-02 00:00:00', 'count': 5}]
+        total = [{'date': '2020-01-02 00:00:00', 'count': 10}, {'date': '2020-01-01 00:00:00', 'count': 4}]
+        results = combined_split_and_normalized_counts(matching, total)
+        assert results[0] == {'date': '2020-01-01', 'total_count': 4, 'count': 0, 'ratio': 0}
+        assert results[1] == {'date': '2020-01-02', 'total_count': 10, 'count': 5, 'ratio': 0.5}
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+import datetime
+import threading
+import time
+import unittest
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.backends.memory import MemoryBackend
+
+from server.cache import LocalLRUCacheProxy, SingleFlight, CoalescingCacheRegion, canonical_arg, canonical_key, \
+    cache_keys_for_calls, _keyword_safe_key_generator
+
+
+def _local_tier(**settings):
+    # an in-process tier in front of an in-memory backend (standing in for Redis)
+    redis = MemoryBackend({})
+    local = LocalLRUCacheProxy().wrap(redis)
+    for name, value in settings.items():
+        setattr(local, name, value)
+    return local, redis
+
+
+class LocalLRUCacheProxyTest(unittest.TestCase):
+
+    def testReadsThroughAndCounts(self):
+        local, redis = _local_tier()
+        assert local.get('missing') is NO_VALUE
+        redis.set('key', {'count': 1})
+        assert local.get('key') == {'count': 1}     # from redis
+        assert local.get('key') == {'count': 1}     # from the local tier
+        stats = local.stats()
+        assert stats['local_hits'] == 1
+        assert stats['local_misses'] == 2
+        assert stats['redis_hits'] == 1
+        assert stats['redis_misses'] == 1
+        assert stats['local_items'] == 1
+
+    def testCallersGetCopies(self):
+        local, _ = _local_tier()
+        local.set('key', {'tags': []})
+        local.get('key')['tags'].append('changed')
+        assert local.get('key') == {'tags': []}
+
+    def testTtlExpiry(self):
+        local, redis = _local_tier(ttl=0.05)
+        local.set('key', 'first')
+        redis.set('key', 'second')  # ie. another worker updated it
+        assert local.get('key') == 'first'
+        time.sleep(0.1)
+        assert local.get('key') == 'second'
+
+    def testItemEviction(self):
+        local, redis = _local_tier(max_items=3)
+        for i in range(5):
+            local.set('key{}'.format(i), i)
+        local.get('key2')   # now the most recently used
+        local.set('key5', 5)
+        stats = local.stats()
+        assert stats['local_items'] == 3
+        assert stats['local_evictions'] == 3
+        redis.delete_multi(['key2', 'key3'])   # so anything we get back came from the local tier
+        assert local.get('key2') == 2
+        assert local.get('key3') is NO_VALUE
+
+    def testByteEviction(self):
+        local, redis = _local_tier(max_bytes=3000, max_item_bytes=2000)
+        for i in range(3):
+            local.set('key{}'.format(i), 'x' * 1000)
+        assert local.stats()['local_items'] == 2
+        assert local.stats()['local_bytes'] <= 3000
+        local.set('big', 'x' * 5000)    # too big for the local tier, but still saved in redis
+        assert redis.get('big') == 'x' * 5000
+        redis.delete('big')
+        assert local.get('big') is NO_VALUE
+
+    def testDelete(self):
+        local, redis = _local_tier()
+        local.set_multi({'a': 1, 'b': 2})
+        local.delete_multi(['a', 'b'])
+        assert local.get_multi(['a', 'b']) == [NO_VALUE, NO_VALUE]
+        assert redis.get('a') is NO_VALUE
+        assert local.stats()['local_bytes'] == 0
+
+
+class CanonicalKeyTest(unittest.TestCase):
+
+    def testFormat(self):
+        key = canonical_key('server.views.apicache:_cached_tag', (123, 'abc'), {'public': True, 'q': None})
+        assert key == 'v3:server.views.apicache:_cached_tag|i123|s3:abc|public=b1|q=n'
+
+    def testEquivalentCallsMatch(self):
+        assert canonical_key('ns', (), {'a': 1, 'b': 2}) == canonical_key('ns', (), {'b': 2, 'a': 1})
+        assert canonical_arg({'b': [1, 2], 'a': 'x'}) == canonical_arg({'a': 'x', 'b': [1, 2]})
+        assert canonical_arg({3, 1, 2}) == canonical_arg({2, 3, 1})
+        assert canonical_arg((1, 2)) == canonical_arg([1, 2])
+
+    def testDifferentCallsDontCollide(self):
+        assert canonical_key('ns', ('a|b',), {}) != canonical_key('ns', ('a', 'b'), {})
+        assert canonical_key('ns', ('a,b',), {}) != canonical_key('ns', (['a', 'b'],), {})
+        assert canonical_key('ns', ('x=1',), {}) != canonical_key('ns', (), {'x': 1})
+        assert len({canonical_arg(v) for v in [1, '1', True, 1.0]}) == 4
+        assert len({canonical_arg(v) for v in [None, '', 'undefined', 0, False, []]}) == 6
+        assert canonical_arg([1, 2]) != canonical_arg([2, 1])
+        assert canonical_arg(datetime.date(2020, 1, 1)) != canonical_arg(datetime.datetime(2020, 1, 1))
+
+    def testBatchKeysMatchDecoratedCalls(self):
+        region = CoalescingCacheRegion(function_key_generator=_keyword_safe_key_generator)
+        region.configure('dogpile.cache.memory')
+
+        @region.cache_on_arguments()
+        def _story_count(api_key, q, fq=None, split=False):
+            return [api_key, q, fq, split]
+
+        calls = [
+            (('key', 'robots'), {}),
+            (('key',), {'q': 'cars', 'fq': 'tags_id_media:1'}),
+            (('key', 'trucks', None, True), {}),
+            ((), {'split': True, 'q': 'boats', 'api_key': 'key'}),
+        ]
+        for args, kwargs in calls:
+            _story_count(*args, **kwargs)
+        keys = cache_keys_for_calls(_story_count, calls)
+        assert len(set(keys)) == len(calls)
+        for key, (args, kwargs) in zip(keys, calls):
+            assert region.get(key) == _story_count.original(*args, **kwargs)
+
+    def testLongKeysAreHashed(self):
+        key = canonical_key('ns', ('x' * 500,), {})
+        assert key.startswith('v3:ns|sha1:')
+        assert key != canonical_key('ns', ('x' * 501,), {})
+
+
+def _run_together(fn, count):
+    # start `count` threads calling fn, and return what each one got back (or raised)
+    results = [None] * count
+
+    def _call(idx):
+        try:
+            results[idx] = fn()
+        except Exception as e:
+            results[idx] = e
+
+    threads = [threading.Thread(target=_call, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    @staticmethod
+    def _calls_at_once(in_flight, key_fn, count, value=None, error=None):
+        """
+        Call `key_fn` with a slow creator from `count` threads; the creator doesn't finish until all the others are
+        waiting on it.
+        :return: how many times the creator ran, and what each thread got back (or raised)
+        """
+        calls = []
+        release = threading.Event()
+
+        def _create():
+            calls.append(1)
+            release.wait(5)
+            if error is not None:
+                raise error
+            return value
+
+        def _release_when_queued():
+            deadline = time.time() + 5
+            while (in_flight.coalesced_count < count - 1) and (time.time() < deadline):
+                time.sleep(0.01)
+            release.set()
+
+        releaser = threading.Thread(target=_release_when_queued)
+        releaser.start()
+        results = _run_together(lambda: key_fn(_create), count)
+        releaser.join()
+        return len(calls), results
+
+    def testCreatorRunsOnce(self):
+        in_flight = SingleFlight()
+        calls, results = self._calls_at_once(in_flight, lambda fn: in_flight.do('key', fn), 5,
+                                             value={'stories': [1, 2]})
+        assert calls == 1
+        assert in_flight.coalesced_count == 4
+        assert results == [{'stories': [1, 2]}] * 5
+
+    def testEachWaiterGetsACopy(self):
+        in_flight = SingleFlight()
+        _, results = self._calls_at_once(in_flight, lambda fn: in_flight.do('key', fn), 3, value={'stories': [1, 2]})
+        assert len({id(r) for r in results}) == 3
+        results[0]['stories'].append(3)
+        assert results[1:] == [{'stories': [1, 2]}] * 2
+
+    def testErrorsReachEveryWaiter(self):
+        in_flight = SingleFlight()
+        calls, results = self._calls_at_once(in_flight, lambda fn: in_flight.do('key', fn), 4,
+                                             error=ValueError("back-end is down"))
+        assert calls == 1
+        assert all(isinstance(r, ValueError) for r in results)
+        assert in_flight.do('key', lambda: 'ok') == 'ok'    # and the next call tries again
+
+    def testRegionCoalesces(self):
+        region = CoalescingCacheRegion().configure('dogpile.cache.memory')
+        calls, results = self._calls_at_once(region.in_flight, lambda fn: region.get_or_create('key', fn), 4,
+                                             value=['a', 'b'])
+        assert calls == 1
+        assert results == [['a', 'b']] * 4
+        assert region.get('key') == ['a', 'b']
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from server.util.csv import dict2row, stream_csv_chunks
+
+PROPS = ['stories_id', 'title', 'themes', 'ratio', 'missing', 'media_url']
+ROWS = [
+    {'stories_id': 1, 'title': 'A "quoted" title, with a comma', 'themes': ['politics', 'elections'], 'ratio': 0.25,
+     'media_url': None},
+    {'stories_id': 2, 'title': 'Line\nbreak', 'themes': [], 'ratio': 1, 'media_url': ''},
+]
+
+
+def _old_style_csv(props, rows):
+    return ','.join(props) + '\n' + ''.join([','.join(dict2row(props, r)) + '\n' for r in rows])
+
+
+class StreamCsvChunksTest(unittest.TestCase):
+
+    def testMatchesDict2Row(self):
+        assert ''.join(stream_csv_chunks(ROWS, PROPS)) == _old_style_csv(PROPS, ROWS)
+
+    def testColumnNames(self):
+        chunks = list(stream_csv_chunks(ROWS, PROPS, column_names=[p.upper() for p in PROPS]))
+        assert chunks[0] == ','.join([p.upper() for p in PROPS]) + '\n'
+
+    def testChunking(self):
+        rows = ROWS * 1000
+        chunks = list(stream_csv_chunks(rows, PROPS, chunk_size=1024))
+        assert len(chunks) > 2
+        assert max([len(c) for c in chunks[1:]]) < 1024 + 200
+        assert ''.join(chunks) == _old_style_csv(PROPS, rows)
+
+    def testBadValuesFallBack(self):
+        rows = [{'stories_id': 1, 'title': 'ok', 'themes': [1, 2]}]
+        output = ''.join(stream_csv_chunks(rows, PROPS))
+        assert 'ERROR' in output
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import datetime
+import pickle
+import unittest
+
+from server.util.serializer import CompactSerializer, SerializationError, HEADER_MAGIC, FORMAT_PICKLE, \
+    COMPRESSION_NONE
+
+STORY_PAGE = {
+    'stories': [{'stories_id': i, 'title': 'Story {}'.format(i), 'media_id': 1, 'tags': [{'tags_id': 9}]}
+                for i in range(200)],
+    'link_ids': {'next': 1234, 'previous': None},
+    'ratio': 0.5,
+    'is_public': True,
+}
+
+
+class CompactSerializerTest(unittest.TestCase):
+
+    def testMsgpackRoundTrip(self):
+        serializer = CompactSerializer()
+        data = serializer.dumps(STORY_PAGE)
+        assert data[:4] == HEADER_MAGIC + b'mz'     # msgpack, compressed because it is big
+        assert serializer.loads(data) == STORY_PAGE
+        assert len(data) < len(pickle.dumps(STORY_PAGE, pickle.HIGHEST_PROTOCOL))
+
+    def testSmallValuesArentCompressed(self):
+        serializer = CompactSerializer()
+        data = serializer.dumps({'count': 12})
+        assert data[:4] == HEADER_MAGIC + b'm-'
+        assert serializer.loads(data) == {'count': 12}
+
+    def testIntKeys(self):
+        serializer = CompactSerializer()
+        assert serializer.loads(serializer.dumps({1: 'a', 2: 'b'})) == {1: 'a', 2: 'b'}
+
+    def testTuplesComeBackAsLists(self):
+        # msgpack doesn't have tuples, so (as documented) anything cached comes back with lists instead
+        serializer = CompactSerializer()
+        assert serializer.loads(serializer.dumps({'pair': (1, 2)})) == {'pair': [1, 2]}
+        assert serializer.loads(serializer.dumps((1, 'a'))) == [1, 'a']
+
+    def testPickleFallback(self):
+        serializer = CompactSerializer()
+        value = {'date': datetime.datetime(2020, 1, 1)}    # msgpack can't do datetimes
+        data = serializer.dumps(value)
+        assert data[:3] == HEADER_MAGIC + b'p'
+        assert serializer.loads(data) == value
+
+    def testPickleFormat(self):
+        serializer = CompactSerializer(data_format=FORMAT_PICKLE, compression=COMPRESSION_NONE)
+        data = serializer.dumps(STORY_PAGE)
+        assert data[:4] == HEADER_MAGIC + b'p-'
+        assert serializer.loads(data) == STORY_PAGE
+
+    def testLegacyPickles(self):
+        # values written to Redis before this serializer don't have a header
+        legacy = pickle.dumps(STORY_PAGE)
+        assert CompactSerializer().loads(legacy) == STORY_PAGE
+
+    def testNoPickleAllowed(self):
+        serializer = CompactSerializer(allow_pickle=False)
+        assert serializer.loads(serializer.dumps(STORY_PAGE)) == STORY_PAGE
+        self.assertRaises(SerializationError, serializer.dumps, {'date': datetime.datetime(2020, 1, 1)})
+        self.assertRaises(SerializationError, serializer.loads, pickle.dumps(STORY_PAGE))
+        pickled = CompactSerializer().dumps({'date': datetime.datetime(2020, 1, 1)})
+        self.assertRaises(SerializationError, serializer.loads, pickled)
+        self.assertRaises(ValueError, CompactSerializer, data_format=FORMAT_PICKLE, allow_pickle=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
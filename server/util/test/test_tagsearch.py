@@ -0,0 +1,40 @@
+import unittest
+
+from server.util.tagsearch import TagSearchIndex
+
+TAGS = [
+    {'tags_id': 1, 'label': 'Andalucía, Spain', 'tag': 'geonames_2593109'},
+    {'tags_id': 2, 'label': 'Georgia', 'tag': 'geonames_4197000'},
+    {'tags_id': 3, 'label': 'Massachusetts', 'tag': 'geonames_6254926'},
+    {'tags_id': 4, 'label': 'New Jersey', 'tag': 'geonames_5101760'},
+    {'tags_id': 5, 'label': 'New York', 'tag': 'geonames_5128638'},
+    {'tags_id': 6, 'label': None, 'tag': 'york'},
+    {'tags_id': 7, 'label': 'Yorkshire', 'tag': 'geonames_2633352'},
+]
+
+
+class TagSearchIndexTest(unittest.TestCase):
+
+    def testMatchesSubstringSearch(self):
+        index = TagSearchIndex(TAGS)
+        for search_string in ['a', 'or', 'new', 'ORK', 'sach', 'spain', 'ía', 'new york', 'xyz']:
+            expected = {t['tags_id'] for t in TAGS if search_string.lower() in (t['label'] or t['tag']).lower()}
+            results = index.search(search_string)
+            assert {t['tags_id'] for t in results} == expected
+            assert len(results) == len(expected)
+
+    def testRanking(self):
+        index = TagSearchIndex(TAGS)
+        results = [t['tags_id'] for t in index.search('york')]
+        assert results == [6, 7, 5]  # exact, then prefix, then word prefix
+        results = [t['tags_id'] for t in index.search('Ge')]
+        assert results[0] == 2
+
+    def testLimit(self):
+        index = TagSearchIndex(TAGS)
+        assert len(index.search('e', 2)) == 2
+        assert index.search('') == []
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
-import requests
 import json
 
 from server import config
+import server.util.http_client as http_client
 
 # Helpers for accessing data from the Media Cloud Word Embeddings server
 
@@ -25,7 +25,8 @@ def topic_similar_words(topics_id, snapshots_id, words):
 
 
 def _query_for_json(endpoint, data):
-    response = requests.post("{}{}".format(config.get('WORD_EMBEDDINGS_SERVER_URL'), endpoint), data=data)
+    response = http_client.post("{}{}".format(config.get('WORD_EMBEDDINGS_SERVER_URL'), endpoint), data=data,
+                                upstream='word-embeddings')
     try:
         response_json = response.json()
         if 'results' in response_json:
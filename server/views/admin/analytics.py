@@ -2,8 +2,8 @@ import logging
 from flask import jsonify
 import flask_login
 
-from server import app, analytics_db
-from server.cache import cache
+from server import app, analytics_db, mc_clients
+from server.cache import cache, cache_stats
 from server.util.request import api_error_handler
 import server.views.apicache as apicache
 
@@ -32,3 +32,19 @@ def api_admin_top_stats(the_type, the_action):
                     'count': row[the_action]
                 })
     return jsonify({'list': results})
+
+
+@app.route('/api/admin/cache/stats', methods=['GET'])
+@api_error_handler
+@flask_login.login_required
+def api_admin_cache_stats():
+    # note: these are counts for whichever worker process happens to handle this request
+    return jsonify({'stats': cache_stats()})
+
+
+@app.route('/api/admin/mc-clients/stats', methods=['GET'])
+@api_error_handler
+@flask_login.login_required
+def api_admin_mc_client_stats():
+    # note: these are counts for whichever worker process happens to handle this request
+    return jsonify({'stats': mc_clients.stats()})
@@ -4,12 +4,18 @@ to the user (ie. it is a cross-user cache). This is because we don't have visibi
 like stories, sources, etc.
 """
 
-from server import TOOL_API_KEY
-from server.cache import cache
+import concurrent.futures
+import logging
+from dogpile.cache.api import NO_VALUE
+
+from server import TOOL_API_KEY, executor
+from server.cache import cache, get_cached_multi, set_cached_multi
 import server.util.wordembeddings as wordembeddings
 from server.auth import user_mediacloud_client, user_admin_mediacloud_client, user_is_admin
 from server.util.tags import is_bad_theme, TagSetDiscoverer
 
+logger = logging.getLogger(__name__)
+
 
 def media(media_id):
     return _cached_media(None, media_id)
@@ -21,6 +27,26 @@ def get_media_with_key(mc_api_key, media_id):
     return _cached_media(mc_api_key, media_id)
 
 
+def get_media_batch_with_key(mc_api_key, media_ids):
+    """
+    Look up a batch of media at once. Anything already cached is read in one round-trip, and the rest are fetched in
+    parallel. This runs on its own long-lived thread pool, rather than the flask executor, because it is used from
+    Response generators that don't have a request context to copy.
+    :return: a dict of media_id => media
+    """
+    media_ids = list(set(media_ids))
+    cached = get_cached_multi(_cached_media, [((mc_api_key, mid), {}) for mid in media_ids])
+    media_lookup = {mid: m for mid, m in zip(media_ids, cached) if m is not NO_VALUE}
+    missing_ids = [mid for mid in media_ids if mid not in media_lookup]
+    for mid, m in zip(missing_ids, _media_pool.map(lambda mid: _cached_media(mc_api_key, mid), missing_ids)):
+        media_lookup[mid] = m
+    return media_lookup
+
+
+MEDIA_BATCH_WORKERS = 10
+_media_pool = concurrent.futures.ThreadPoolExecutor(max_workers=MEDIA_BATCH_WORKERS, thread_name_prefix='media-batch')
+
+
 @cache.cache_on_arguments()
 def _cached_media(mc_api_key, media_id):
     # api_key passed in just to make this a user-level cache
@@ -28,6 +54,15 @@ def _cached_media(mc_api_key, media_id):
     return user_mc.media(media_id)
 
 
+def media_batch(media_ids):
+    """
+    Look up a list of media at once (ie. a user's favorites), reading whatever is cached in one round-trip and
+    fetching the rest in parallel.
+    :return: the media, in the same order as the ids
+    """
+    return cached_batch(_cached_media, [((None, media_id), {}) for media_id in media_ids])
+
+
 def collection(tags_id):
     # Yes collections are just tags, but this is a helpful convenience method included to make the code more readable
     return _cached_tag(tags_id)
@@ -37,6 +72,11 @@ def tag(tags_id):
     return _cached_tag(tags_id)
 
 
+def tag_batch(tags_ids):
+    # like media_batch, but for tags (or collections)
+    return cached_batch(_cached_tag, [((tags_id,), {}) for tags_id in tags_ids])
+
+
 @cache.cache_on_arguments()
 def _cached_tag(tags_id):
     user_mc = user_mediacloud_client()
@@ -55,9 +95,73 @@ def _cached_story_count(q, fq, **kwargs):
     return user_mc.storyCount(solr_query=q, solr_filter=fq,  **kwargs)
 
 
+def story_counts(queries):
+    """
+    Count a batch of queries at once (see `cached_batch`).
+    :param queries: a list of (q, fq, split) tuples
+    :return: a list of story count results, in the same order as the queries
+    """
+    return cached_batch(_cached_story_count, [((q, fq), _story_count_kwargs(split)) for q, fq, split in queries])
+
+
+def _story_count_kwargs(split):
+    # only add split if we need it, so the cache keys match calls to story_count(q, fq)
+    kwargs = {'http_method': 'POST'}
+    if split:
+        kwargs['split'] = True
+    return kwargs
+
+
+def cached_batch(cached_fn, calls):
+    """
+    Make a batch of calls to a `@cache.cache_on_arguments()` function. Anything already cached is read in one
+    round-trip, and the rest are called in parallel on the shared executor pool (which bounds how many run at once).
+    :param calls: a list of (args, kwargs) tuples
+    :return: a list of results, in the same order as the calls
+    """
+    results = get_cached_multi(cached_fn, calls)
+    jobs = [{'index': idx, 'fn': cached_fn, 'args': calls[idx][0], 'kwargs': calls[idx][1]}
+            for idx, r in enumerate(results) if r is NO_VALUE]
+    for job_result in _cached_call_job.map(jobs):
+        results[job_result['index']] = job_result['results']
+    return results
+
+
+def parallel_batch(fn, calls):
+    """
+    Make a batch of calls to any function in parallel on the shared executor pool. Use this for helpers that aren't
+    cached themselves (ie. ones that make a few cached calls each); for cached ones use `cached_batch` instead.
+    :param calls: a list of (args, kwargs) tuples
+    :return: a list of results, in the same order as the calls
+    """
+    results = [None] * len(calls)
+    jobs = [{'index': idx, 'fn': fn, 'args': args, 'kwargs': kwargs} for idx, (args, kwargs) in enumerate(calls)]
+    for job_result in _cached_call_job.map(jobs):
+        results[job_result['index']] = job_result['results']
+    return results
+
+
+@executor.job
+def _cached_call_job(job):
+    return {'index': job['index'], 'results': job['fn'](*job['args'], **job['kwargs'])}
+
+
+def _word_count_kwargs(kwargs):
+    # always post it so long queries work (http_method goes first, so the cache keys match however this is called)
+    return {'http_method': 'POST', **{k: v for k, v in kwargs.items() if k != 'http_method'}}
+
+
 def word_count(q, fq, **kwargs):
-    # post it so long queries work
-    return _cached_word_count(q, fq, http_method='POST', **kwargs)
+    return _cached_word_count(q, fq, **_word_count_kwargs(kwargs))
+
+
+def word_counts(queries, **kwargs):
+    """
+    Count words for a batch of queries at once (see `cached_batch`).
+    :param queries: a list of (q, fq) tuples; any kwargs are passed along to each word count
+    :return: a list of word count results, in the same order as the queries
+    """
+    return cached_batch(_cached_word_count, [((q, fq), _word_count_kwargs(kwargs)) for q, fq in queries])
 
 
 @cache.cache_on_arguments()
@@ -83,15 +187,58 @@ def _cached_story(api_key, stories_id, **kwargs):
 
 
 def word2vec_google_2d(words):
-    return _cached_word2vec_google_2d(words)
+    """
+    Get the position of each word in the 2D google news word2vec model.
+    :return: a dict of word => {'x': ..., 'y': ...}, for the words the model knows
+    """
+    return word2vec_2d_positions(_cached_word2vec_google_2d_term, (), wordembeddings.google_news_2d, words)
 
 
 @cache.cache_on_arguments()
-def _cached_word2vec_google_2d(words):
+def _cached_word2vec_google_2d_term(word):
     # don't need to be user-level cache here - can be app-wide because results are from another service that doesn't
     # have any concept of permissioning
-    word2vec_results = wordembeddings.google_news_2d(words)
-    return word2vec_results
+    results = wordembeddings.google_news_2d([word])
+    return results[0] if len(results) > 0 else None
+
+
+def word2vec_2d_positions(cached_term_fn, term_args, fetch_fn, words):
+    """
+    Word positions are cached one word at a time, so lists of top words that overlap (or are in a different order)
+    share their cached positions. This reads all the cached words in one round-trip, asks the embeddings server
+    about just the missing ones (in one call), and saves those in one round-trip.
+    :param cached_term_fn: the `@cache.cache_on_arguments()` function that looks up one word; called as
+                           `cached_term_fn(*term_args, word)`
+    :param fetch_fn: a function that fetches the positions of a list of words from the embeddings server
+    :return: a dict of word => position, for the words the model knows
+    """
+    words = list(dict.fromkeys(words))  # unique, but still in order
+    calls = [(term_args + (w,), {}) for w in words]
+    cached = get_cached_multi(cached_term_fn, calls)
+    positions = {w: p for w, p in zip(words, cached) if (p is not NO_VALUE) and (p is not None)}
+    missing_words = [w for w in words if w not in positions]
+    if len(missing_words) > 0:
+        fetched, reliable = word2vec_positions_by_word(missing_words, fetch_fn(missing_words))
+        if reliable and (len(fetched) > 0):
+            set_cached_multi(cached_term_fn, [(term_args + (w,), {}) for w in fetched.keys()], list(fetched.values()))
+        positions.update(fetched)
+    return positions
+
+
+def word2vec_positions_by_word(words, results):
+    """
+    Match up the results from the embeddings server with the words we asked about. Each result names its word, so
+    use that; if they don't, fall back to assuming there is one result per word, in order.
+    :return: a dict of word => position, and whether the matching is reliable enough to cache
+    """
+    if all('word' in r for r in results):
+        requested = set(words)
+        return {r['word']: r for r in results if r['word'] in requested}, True
+    if len(results) == len(words):
+        return dict(zip(words, results)), True
+    # some words got dropped, so we can't tell which result goes with which word; use them but don't remember them
+    logger.warning("Got {} word2vec results for {} words".format(len(results), len(words)))
+    return dict(zip(words, results)), False
 
 
 def tag_set(tag_sets_id):
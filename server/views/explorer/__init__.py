@@ -1,4 +1,5 @@
 import logging
+from collections import Counter
 from flask import request, jsonify
 import datetime as dt
 import flask_login
@@ -115,12 +116,12 @@ def file_name_for_download(label, type_of_download):
 @api_error_handler
 def count_stats():
     # count the uses of sources or collection whenever the user clicks the search button
-    sources = request.args['sources'].split(",") if 'sources' in request.args else None
-    collections = request.args['collections'].split(",") if 'collections' in request.args else None
-    for media_id in sources:
-        analytics_db.increment_count(analytics_db.TYPE_MEDIA, media_id,
-                                     analytics_db.ACTION_EXPLORER_QUERY, sources.count(media_id))
-    for collection_id in collections:
-        analytics_db.increment_count(analytics_db.TYPE_COLLECTION, collection_id,
-                                     analytics_db.ACTION_EXPLORER_QUERY, collections.count(collection_id))
+    sources = request.args['sources'].split(",") if 'sources' in request.args else []
+    collections = request.args['collections'].split(",") if 'collections' in request.args else []
+    # these are written to the DB in the background, so the user doesn't wait on them
+    for media_id, count in Counter(sources).items():
+        analytics_db.queue_increment_count(analytics_db.TYPE_MEDIA, media_id, analytics_db.ACTION_EXPLORER_QUERY, count)
+    for collection_id, count in Counter(collections).items():
+        analytics_db.queue_increment_count(analytics_db.TYPE_COLLECTION, collection_id,
+                                           analytics_db.ACTION_EXPLORER_QUERY, count)
     return jsonify({'status': 'ok'})
@@ -10,23 +10,48 @@ from server.views import TAG_SAMPLE_SIZE, TAG_COUNT_SAMPLE_SIZE
 
 
 def normalized_and_story_count(q, fq, open_q):
-    return {
-        'total': base_apicache.story_count(q, fq)['count'],
-        'normalized_total': base_apicache.story_count(open_q, fq)['count'],
-    }
+    return normalized_and_story_counts([(q, fq, open_q)])[0]
+
+
+def normalized_and_story_counts(queries):
+    """
+    Batch version of normalized_and_story_count, so all the counts are fetched in parallel.
+    :param queries: a list of (q, fq, open_q) tuples
+    """
+    count_queries = []
+    for q, fq, open_q in queries:
+        count_queries += [(q, fq, False), (open_q, fq, False)]
+    counts = base_apicache.story_counts(count_queries)
+    return [{
+        'total': counts[idx * 2]['count'],
+        'normalized_total': counts[idx * 2 + 1]['count'],
+    } for idx in range(len(queries))]
 
 
 def normalized_and_story_split_count(q, open_q, start_date, end_date):
-    fq = dates_as_filter_query(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
-    matching = base_apicache.story_count(q, fq, split=True)
-    matching = add_missing_dates_to_split_story_counts(matching['counts'], start_date, end_date)
-    total = base_apicache.story_count(open_q, fq, split=True)
-    total = add_missing_dates_to_split_story_counts(total['counts'], start_date, end_date)
-    return {
-        'counts': combined_split_and_normalized_counts(matching, total),
-        'total': sum([day['count'] for day in matching]),
-        'normalized_total': sum([day['count'] for day in total]),
-    }
+    return normalized_and_story_split_counts([(q, open_q, start_date, end_date)])[0]
+
+
+def normalized_and_story_split_counts(queries):
+    """
+    Batch version of normalized_and_story_split_count, so all the counts are fetched in parallel.
+    :param queries: a list of (q, open_q, start_date, end_date) tuples
+    """
+    count_queries = []
+    for q, open_q, start_date, end_date in queries:
+        fq = dates_as_filter_query(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+        count_queries += [(q, fq, True), (open_q, fq, True)]
+    counts = base_apicache.story_counts(count_queries)
+    results = []
+    for idx, (_q, _open_q, start_date, end_date) in enumerate(queries):
+        matching = add_missing_dates_to_split_story_counts(counts[idx * 2]['counts'], start_date, end_date)
+        total = add_missing_dates_to_split_story_counts(counts[idx * 2 + 1]['counts'], start_date, end_date)
+        results.append({
+            'counts': combined_split_and_normalized_counts(matching, total),
+            'total': sum([day['count'] for day in matching]),
+            'normalized_total': sum([day['count'] for day in total]),
+        })
+    return results
 
 
 def sentence_list(q, fq=None, rows=1000, include_stories=True):
@@ -24,21 +24,27 @@ def explorer_story_count_csv():
     queries = json.loads(data['queries'])
     label = " ".join([q['label'] for q in queries])
     filename = file_name_for_download(label, filename)
+    # fetch all the solr-based counts in one batch, so they run in parallel
+    solr_queries = {}
+    for idx, q in enumerate(queries):
+        if not ((len(q['collections']) == 0) and only_queries_reddit(q['sources'])):
+            solr_q, solr_fq = parse_query_with_keywords(q)
+            solr_open_query = concatenate_query_for_solr(solr_seed_query=WILDCARD_ASTERISK, media_ids=q['sources'],
+                                                         tags_ids=q['collections'])
+            solr_queries[idx] = (solr_q, solr_fq, solr_open_query)
+    solr_counts = dict(zip(solr_queries.keys(), apicache.normalized_and_story_counts(list(solr_queries.values()))))
     # now compute total attention for all results
     story_count_results = []
-    for q in queries:
-        if (len(q['collections']) == 0) and only_queries_reddit(q['sources']):
+    for idx, q in enumerate(queries):
+        if idx in solr_counts:
+            story_counts = solr_counts[idx]
+        else:
             start_date, end_date = parse_query_dates(q)
             provider = RedditPushshiftProvider()
             story_counts = provider.normalized_count_over_time(query=q['q'],
                                                                start_date=start_date,
                                                                end_date=end_date,
                                                                subreddits=NEWS_SUBREDDITS)
-        else:
-            solr_q, solr_fq = parse_query_with_keywords(q)
-            solr_open_query = concatenate_query_for_solr(solr_seed_query=WILDCARD_ASTERISK, media_ids=q['sources'],
-                                                         tags_ids=q['collections'])
-            story_counts = apicache.normalized_and_story_count(solr_q, solr_fq, solr_open_query)
         story_count_results.append({
             'query': q['label'],
             'matching_stories': story_counts['total'],
@@ -107,22 +113,30 @@ def api_explorer_combined_story_split_count_csv():
     queries = json.loads(data['queries'])
     label = " ".join([q['label'] for q in queries])
     filename = file_name_for_download(label, filename)
+    # fetch all the solr-based counts in one batch, so they run in parallel
+    solr_queries = {}
+    for idx, q in enumerate(queries):
+        if not ((len(q['collections']) == 0) and only_queries_reddit(q['sources'])):
+            start_date, end_date = parse_query_dates(q)
+            solr_q, _solr_fq = parse_query_with_keywords(q)
+            solr_open_query = concatenate_query_for_solr(solr_seed_query=WILDCARD_ASTERISK, media_ids=q['sources'],
+                                                         tags_ids=q['collections'],
+                                                         custom_collection=q['searches'])
+            solr_queries[idx] = (solr_q, solr_open_query, start_date, end_date)
+    solr_counts = dict(zip(solr_queries.keys(),
+                           apicache.normalized_and_story_split_counts(list(solr_queries.values()))))
     # now compute total attention for all results
     story_count_results = []
-    for q in queries:
-        start_date, end_date = parse_query_dates(q)
-        if (len(q['collections']) == 0) and only_queries_reddit(q['sources']):
+    for idx, q in enumerate(queries):
+        if idx in solr_counts:
+            story_counts = solr_counts[idx]
+        else:
+            start_date, end_date = parse_query_dates(q)
             provider = RedditPushshiftProvider()
             story_counts = provider.normalized_count_over_time(query=q['q'],
                                                                start_date=start_date,
                                                                end_date=end_date,
                                                                subreddits=NEWS_SUBREDDITS)
-        else:
-            solr_q, _solr_fq = parse_query_with_keywords(q)
-            solr_open_query = concatenate_query_for_solr(solr_seed_query=WILDCARD_ASTERISK, media_ids=q['sources'],
-                                                         tags_ids=q['collections'],
-                                                     custom_collection=q['searches'])
-            story_counts = apicache.normalized_and_story_split_count(solr_q, solr_open_query, start_date, end_date)
         story_count_results.append({
             'label': q['label'],
             'by_date': story_counts['counts'],
@@ -7,6 +7,7 @@ from mediacloud.api import MediaCloud
 import server.views.apicache as base_cache
 from server import app
 import server.util.csv as csv
+import server.util.pager as pager
 import server.util.tags as tag_util
 from server.auth import user_mediacloud_key
 from server.platforms.reddit_pushshift import RedditPushshiftProvider,  NEWS_SUBREDDITS
@@ -81,47 +82,49 @@ def _stream_story_list_csv(filename, q, fq, stories_per_page=500, sort=MediaClou
 
 # generator you can use to handle a long list of stories row by row (one row per story)
 def _story_list_by_page_as_csv_row(api_key, q, fq, stories_per_page, sort, page_limit, props):
-    yield ','.join(props) + '\n'  # first send the column names
-    for page in _story_list_by_page(api_key, q, fq, stories_per_page, sort, page_limit):
-        for story in page:
-            cleaned_row = csv.dict2row(props, story)
-            row_string = ','.join(cleaned_row) + '\n'
-            yield row_string
+    stories = (story for page in _story_list_by_page(api_key, q, fq, stories_per_page, sort, page_limit)
+               for story in page)
+    yield from csv.stream_csv_chunks(stories, props)
 
 
 # generator you can use to do something for each page of story results
 def _story_list_by_page(api_key, q, fq, stories_per_page, sort, page_limit=None):
-    last_processed_stories_id = 0  # download oldest first
+    # download oldest first; the next page is fetched in the background while we work on this one
+    pages = pager.prefetching_pages(
+        lambda last_processed_stories_id: _story_page(api_key, q, fq, stories_per_page, sort, last_processed_stories_id),
+        0, lambda page: page[-1]['processed_stories_id'] if len(page) > 0 else None)
     page_count = 0
-    while True:
+    for story_page in pages:
         if (page_limit is not None) and (page_count >= page_limit):
             break
-        story_page = base_cache.story_list(api_key, q, fq, sort=sort, rows=stories_per_page,
-                                           last_processed_stories_id=last_processed_stories_id)
         if len(story_page) == 0:  # this is the last page so bail out
             break
-        for s in story_page:
-            if INCLUDE_MEDIA_METADATA_IN_CSV:
-                # add in media metadata to the story (from lazy cache)
-                media_id = s['media_id']
-                # need to call internal helper because we are in response context and can't automatically fetch current_user
-                media = base_cache.get_media_with_key(api_key, media_id)
-                for k, v in media['metadata'].items():
-                    s['media_{}'.format(k)] = v['label'] if v is not None else None
-            # and add in the story metadata too
-            for k, v in s['metadata'].items():
-                s['story_{}'.format(k)] = v['tag'] if v is not None else None
-
-            story_tag_ids = [t['tags_id'] for t in s['story_tags']]
-            # add in the names of any themes
-            has_themes = False
-            for t in tag_util.TagDiscoverer().nyt_themes_version_tags:
-                if t in story_tag_ids:
-                    has_themes = True
-            if has_themes:
-                        s['themes'] = ", ".join([t['tag'] for t in s['story_tags']
-                                                if t['tag_sets_id'] == tag_util.TagSetDiscoverer().nyt_themes_set])
-        if story_page is not None:
-            yield story_page
-        last_processed_stories_id = story_page[-1]['processed_stories_id']
+        yield story_page
         page_count += 1
+
+
+def _story_page(api_key, q, fq, stories_per_page, sort, last_processed_stories_id):
+    story_page = base_cache.story_list(api_key, q, fq, sort=sort, rows=stories_per_page,
+                                       last_processed_stories_id=last_processed_stories_id)
+    for s in story_page:
+        if INCLUDE_MEDIA_METADATA_IN_CSV:
+            # add in media metadata to the story (from lazy cache)
+            media_id = s['media_id']
+            # need to call internal helper because we are in response context and can't automatically fetch current_user
+            media = base_cache.get_media_with_key(api_key, media_id)
+            for k, v in media['metadata'].items():
+                s['media_{}'.format(k)] = v['label'] if v is not None else None
+        # and add in the story metadata too
+        for k, v in s['metadata'].items():
+            s['story_{}'.format(k)] = v['tag'] if v is not None else None
+
+        story_tag_ids = [t['tags_id'] for t in s['story_tags']]
+        # add in the names of any themes
+        has_themes = False
+        for t in tag_util.TagDiscoverer().nyt_themes_version_tags:
+            if t in story_tag_ids:
+                has_themes = True
+        if has_themes:
+            s['themes'] = ", ".join([t['tag'] for t in s['story_tags']
+                                    if t['tag_sets_id'] == tag_util.TagSetDiscoverer().nyt_themes_set])
+    return story_page
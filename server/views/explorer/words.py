@@ -49,29 +49,36 @@ def explorer_wordcount_csv():
 @api_error_handler
 def api_explorer_compare_words():
     compared_queries = request.args['compared_queries[]'].split(',')
-    results = []
+    solr_queries = []
     for cq in compared_queries:
         dictq = {x[0]: x[1] for x in [x.split("=") for x in cq[1:].split("&")]}
-        solr_q, solr_fq = parse_query_with_keywords(dictq)
-        word_count_result = query_wordcount(solr_q, solr_fq)
-        results.append(word_count_result)
+        solr_queries.append(parse_query_with_keywords(dictq))
+    # count all the queries in parallel, and then get the word2vec positions for all their words in one call
+    results = base_apicache.word_counts(solr_queries, ngram_size=1, num_words=WORD_COUNT_UI_NUM_WORDS,
+                                        sample_size=WORD_COUNT_SAMPLE_SIZE)
+    _add_google_word2vec_positions(results)
     return jsonify({"list": results})
 
 
 def query_wordcount(q, fq, ngram_size=1, num_words=WORD_COUNT_UI_NUM_WORDS, sample_size=WORD_COUNT_SAMPLE_SIZE):
     word_data = base_apicache.word_count(q, fq, ngram_size=ngram_size, num_words=num_words, sample_size=sample_size)
-    # add in word2vec results
-    words = [w['term'] for w in word_data]
-    # and now add in word2vec model position data
-    if len(words) > 0:
-        google_word2vec_data = base_apicache.word2vec_google_2d(words)
-        for i in range(len(google_word2vec_data)):
-            word_data[i]['google_w2v_x'] = google_word2vec_data[i]['x']
-            word_data[i]['google_w2v_y'] = google_word2vec_data[i]['y']
-
+    _add_google_word2vec_positions([word_data])
     return word_data
 
 
+def _add_google_word2vec_positions(word_data_lists):
+    # add in word2vec model position data, looking up all the distinct words across the lists with one call
+    words = [w['term'] for word_data in word_data_lists for w in word_data]
+    if len(words) == 0:
+        return
+    positions = base_apicache.word2vec_google_2d(words)
+    for word_data in word_data_lists:
+        for w in word_data:
+            if w['term'] in positions:
+                w['google_w2v_x'] = positions[w['term']]['x']
+                w['google_w2v_y'] = positions[w['term']]['y']
+
+
 def stream_wordcount_csv(filename, q, fq, ngram_size=1, sample_size=WORD_COUNT_SAMPLE_SIZE):
     # use bigger values for CSV download
     num_words = WORD_COUNT_DOWNLOAD_NUM_WORDS
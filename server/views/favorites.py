@@ -3,7 +3,8 @@ from flask import jsonify
 import flask_login
 from server import app, user_db
 from server.util.request import api_error_handler
-from server.auth import user_mediacloud_client, user_name
+from server.auth import user_name
+import server.views.apicache as base_apicache
 
 logger = logging.getLogger(__name__)
 
@@ -26,9 +27,8 @@ def add_user_favorite_flag_to_collections(collections):
 @flask_login.login_required
 @api_error_handler
 def favorite_collections():
-    user_mc = user_mediacloud_client()
     user_favorited = user_db.get_users_lists(user_name(), 'favoriteCollections')
-    favorited_collections = [user_mc.tag(tag_id) for tag_id in user_favorited]
+    favorited_collections = base_apicache.tag_batch(user_favorited)
     for s in favorited_collections:
         s['isFavorite'] = True
     return jsonify({'list': favorited_collections})
@@ -38,9 +38,8 @@ def favorite_collections():
 @flask_login.login_required
 @api_error_handler
 def favorite_sources():
-    user_mc = user_mediacloud_client()
     user_favorited = user_db.get_users_lists(user_name(), 'favoriteSources')
-    favorited_s = [user_mc.media(media_id) for media_id in user_favorited]
+    favorited_s = base_apicache.media_batch(user_favorited)
     for s in favorited_s:
         s['isFavorite'] = True
     return jsonify({'list': favorited_s})
@@ -5,12 +5,15 @@ from flask import jsonify, request
 from server import app
 from server.auth import user_mediacloud_key
 from server.cache import cache
-from server.util.request import arguments_required, api_error_handler
+from server.util.request import arguments_required, api_error_handler, json_error_response
 from server.views.sources.apicache import tags_in_tag_set
-from server.util.tags import TagSetDiscoverer
+from server.util.tags import TagSetDiscoverer, tag_set_search_index
 
 logger = logging.getLogger(__name__)
 
+SEARCH_RESULTS_LIMIT = 100  # plenty for an autocomplete list
+SEARCH_RESULTS_MAX_LIMIT = 1000
+
 PUBLICATION_COUNTRY_DEFAULTS = [{'label':'United States', 'tags_id': 9353663, 'tag_sets_id': 1935, 'tag_set_name': 'pub_country','tag_set_label':'Publication Country'}, {'label':'United Kingdom', 'tags_id': 9353508, 'tag_sets_id': 1935, 'tag_set_name': 'pub_country','tag_set_label':'Publication Country'}, {'label': 'India', 'tags_id': 9353533, 'tag_sets_id': 1935, 'tag_set_name': 'pub_country', 'tag_set_label': 'Publication Country'}, {'label': 'Spain', 'tags_id': 9353498, 'tag_sets_id': 1935, 'tag_set_name': 'pub_country', 'tag_set_label': 'Publication Country'}, {'label':'Germany', 'tags_id': 9353488, 'tag_sets_id': 1935, 'tag_set_name': 'pub_country','tag_set_label':'Publication Country'}, {'label': 'Italy', 'tags_id': 9353540, 'tag_sets_id': 1935}, {'label': 'France', 'tags_id': 9353504, 'tag_sets_id': 1935, 'tag_set_name': 'pub_country', 'tag_set_label': 'Publication Country'}]
 PUBLICATION_STATE_DEFAULTS = [{'label':'Massachusetts', 'tags_id': 38381372, 'tag_sets_id': 1962, 'tag_set_name': 'pub_state', 'tag_set_label':'Publication State'}, {'label': 'California', 'tags_id': 38380550, 'tag_sets_id': 1962, 'tag_set_label':'Publication State', 'tag_set_name': 'pub_state'}, {'label': 'Georgia', 'tags_id': 38381345, 'tag_sets_id': 1962, 'tag_set_label':'Publication State', 'tag_set_name': 'pub_state'}, {'label': 'Uttar Pradesh', 'tags_id': 38379964, 'tag_sets_id': 1962, 'tag_set_label':'Publication State', 'tag_set_name': 'pub_state'}, {'label': 'Andalucía, Spain', 'tags_id': 38004337, 'tag_sets_id': 1962, 'tag_set_label':'Publication State', 'tag_set_name': 'pub_state'}]
 PRIMARY_LANGUAGE_DEFAULTS = [{'label': 'English', 'tags_id': 9361422, 'tag_sets_id': 1969, 'tag_set_label':'Primary Language', 'tag_set_name': 'primary_language'}, {'label': 'Hindi', 'tags_id': 9361677, 'tag_sets_id': 1969, 'tag_set_label':'Primary Language', 'tag_set_name': 'primary_language'}, {'label': 'French', 'tags_id': 9361467, 'tag_sets_id': 1969, 'tag_set_label':'Primary Language', 'tag_set_name': 'primary_language'}, {'label': 'Spanish', 'tags_id': 9361427, 'tag_sets_id': 1969, 'tag_set_label':'Primary Language', 'tag_set_name': 'primary_language'}, {'label': 'German', 'tags_id': 9353488, 'tag_sets_id': 1969, 'tag_set_label':'Primary Language', 'tag_set_name': 'primary_language'}, {'label': 'Italian', 'tags_id': 9361505, 'tag_sets_id': 1969, 'tag_set_label':'Primary Language', 'tag_set_name': 'primary_language'}]
@@ -36,9 +39,15 @@ def api_metadata_values(tag_sets_id):
 @api_error_handler
 def api_metadata_search(tag_sets_id):
     search_string = request.args['name']
-    # search by ourselves in the file-based cache of all the tags (faster than asking the API to do it over and over)
-    data = tags_in_tag_set(user_mediacloud_key(), tag_sets_id, False, True)
-    matching_tags = [t for t in data['tags'] if search_string.lower() in t['label'].lower()]
+    try:
+        limit = int(request.args.get('limit', SEARCH_RESULTS_LIMIT))
+    except ValueError:
+        return json_error_response("limit must be a number")
+    limit = max(1, min(limit, SEARCH_RESULTS_MAX_LIMIT))
+    # search by ourselves in an index of the file-based cache of all the tags (faster than asking the API to do it
+    # over and over)
+    index = tag_set_search_index(user_mediacloud_key(), tag_sets_id)
+    matching_tags = index.search(search_string, limit)
     return jsonify(matching_tags)
 
 
@@ -133,7 +133,7 @@ def api_collection_details(collection_id):
     if add_in_sources:
         media_in_collection = media_with_tag(collection_id)
         info['sources'] = media_in_collection
-    analytics_db.increment_count(analytics_db.TYPE_COLLECTION, collection_id, analytics_db.ACTION_SOURCE_MGR_VIEW)
+    analytics_db.queue_increment_count(analytics_db.TYPE_COLLECTION, collection_id, analytics_db.ACTION_SOURCE_MGR_VIEW)
     return jsonify({'results': info})
 
 
@@ -1,24 +1,30 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import flask_login
 import time
 from flask import request, jsonify, render_template
 from mediacloud.tags import MediaTag, TAG_ACTION_ADD, TAG_ACTION_REMOVE
 import csv as pycsv
 
-from server import app, config, TOOL_API_KEY, executor
+from server import app, config, job_db
 from server.auth import user_admin_mediacloud_client, user_mediacloud_key, user_name
 from server.util.config import ConfigException
-from server.util.csv import SOURCE_LIST_CSV_METADATA_PROPS
 from server.util.file import save_file_to_upload_folder
 from server.util.mail import send_html_email
-from server.util.request import csv_required, form_fields_required, api_error_handler
-from server.util.tags import TagSetDiscoverer, tags_in_tag_set, media_with_tag
+from server.util.request import csv_required, form_fields_required, api_error_handler, json_error_response
+from server.util.tags import media_with_tag
 from server.util.stringutil import as_tag_name
 from server.views.sources import SOURCE_LIST_CSV_EDIT_PROPS
 import server.views.sources.apicache as apicache
+from server.views.sources.upload import SourceUpload
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_JOB_WORKERS = 2          # how many background uploads can run at once (the rest wait their turn)
+JOB_TYPE_SOURCE_UPLOAD = 'source-upload'
+
+_upload_job_pool = ThreadPoolExecutor(max_workers=UPLOAD_JOB_WORKERS, thread_name_prefix='source-upload-job')
+
 
 @app.route('/api/collections/<collection_id>/update', methods=['POST'])
 @form_fields_required('name', 'description')
@@ -89,6 +95,7 @@ def remove_sources_from_collection(collection_id):
 @api_error_handler
 @csv_required
 def upload_file():
+    # this blocks until the whole upload is done; the UI uses the background job endpoints below instead
     time_start = time.time()
     uploaded_file = request.files['file']
     filepath = save_file_to_upload_folder(uploaded_file, uploaded_file.filename)
@@ -99,38 +106,85 @@ def upload_file():
     except Exception as e:
         logger.error("Couldn't process a CSV row: " + str(e))
         return jsonify({'status': 'Error', 'message': str(e)})
+    upload = SourceUpload(user_admin_mediacloud_client())
+    successful, _ = upload.run(sources_to_create, sources_to_update)
+    _email_upload_results_if_enabled(upload.results, user_name())
+    time_end = time.time()
+    logger.debug("upload_file: {}".format(time_end - time_start))
+    logger.debug("  save file: {}".format(time_file_saved - time_start))
+    logger.debug("  processing: {}".format(time_end - time_file_saved))
+    return jsonify({'results': successful, 'status': "Success"})
+
+
+@app.route('/api/collections/upload-sources/jobs', methods=['POST'])
+@flask_login.login_required
+@api_error_handler
+@csv_required
+def upload_file_job():
+    # same as upload_file, but returns right away with a job id you can poll for progress and results
+    uploaded_file = request.files['file']
+    filepath = save_file_to_upload_folder(uploaded_file, uploaded_file.filename)
+    try:
+        sources_to_update, sources_to_create = _parse_sources_from_csv_upload(filepath)
+    except Exception as e:
+        logger.error("Couldn't process a CSV row: " + str(e))
+        return jsonify({'status': 'Error', 'message': str(e)})
+    job_id = job_db.add_job(JOB_TYPE_SOURCE_UPLOAD, user_name(), {
+        'progress': {'total': len(sources_to_create) + len(sources_to_update), 'processed': 0, 'errors': 0},
+    })
+    job_db.start_heartbeat(job_id)  # so it doesn't look lost while it waits for a free worker
+    try:
+        _upload_job_pool.submit(_run_upload_job, job_id, user_mediacloud_key(), user_name(),
+                                sources_to_create, sources_to_update)
+    except RuntimeError as e:   # ie. the pool is shutting down
+        logger.exception(e)
+        job_db.stop_heartbeat(job_id)
+        job_db.update_job(job_id, {'status': job_db.STATUS_ERROR, 'message': str(e)})
+        return json_error_response("Couldn't start the upload: {}".format(e), 500)
+    return jsonify({'job_id': job_id, 'status': job_db.STATUS_QUEUED})
 
-    all_results = []
-    all_errors = []
-    if len(sources_to_create) > 300:
-        return jsonify({'status': 'Error', 'message': 'Too many sources to upload. The limit is 300.'})
-    else:
-        audit = []
-        if len(sources_to_create) > 0:
-            audit_results, successful, errors = _create_or_update_sources(sources_to_create, True)
-            all_results += successful
-            audit += audit_results
-            all_errors += errors
-        if len(sources_to_update) > 0:
-            audit_results, successful, errors = _create_or_update_sources(sources_to_update, False)
-            all_results += successful
-            audit += audit_results
-            all_errors += errors
-        try:
-            mail_enabled = config.get('SMTP_ENABLED')
-            if mail_enabled == u'1':
-                _email_batch_source_update_results(audit)
-        except ConfigException:
-            logger.debug("Skipping collection file upload confirmation email")
-        for media in all_results:
-            if 'media_id' in media:
-                media['media_id'] = int(
-                    media['media_id'])  # make sure they are ints so no-dupes logic works on front end
-        time_end = time.time()
-        logger.debug("upload_file: {}".format(time_end - time_start))
-        logger.debug("  save file: {}".format(time_file_saved - time_start))
-        logger.debug("  processing: {}".format(time_end - time_file_saved))
-        return jsonify({'results': all_results, 'status': "Success"})
+
+@app.route('/api/collections/upload-sources/jobs/<job_id>', methods=['GET'])
+@flask_login.login_required
+@api_error_handler
+def upload_file_job_status(job_id):
+    job = job_db.find_job(job_id, user_name())
+    if (job is None) or (job['type'] != JOB_TYPE_SOURCE_UPLOAD):
+        return json_error_response("Unknown upload job {}".format(job_id), 404)
+    return jsonify(job)
+
+
+def _run_upload_job(job_id, mc_api_key, username, sources_to_create, sources_to_update):
+    # this runs in a background thread, so it can't use anything from the request that started it; nothing is
+    # watching the future either, so anything that goes wrong has to end up on the job
+
+    def _on_progress(stage, rows):
+        job_db.update_job(job_id, {'stage': stage}, results_to_add=rows,
+                          progress_to_add={'processed': len(rows),
+                                           'errors': len([r for r in rows if r['status'] == 'error'])})
+
+    try:
+        job_db.update_job(job_id, {'status': job_db.STATUS_RUNNING})
+        upload = SourceUpload(user_admin_mediacloud_client(mc_api_key), _on_progress)
+        upload.run(sources_to_create, sources_to_update)
+        with app.app_context():
+            _email_upload_results_if_enabled(upload.results, username)
+        # the final rows have the int media_ids and any metadata errors
+        job_db.update_job(job_id, {'status': job_db.STATUS_COMPLETE, 'results': upload.results})
+    except Exception as e:
+        logger.exception(e)
+        job_db.update_job(job_id, {'status': job_db.STATUS_ERROR, 'message': str(e)})
+    finally:
+        job_db.stop_heartbeat(job_id)
+
+
+def _email_upload_results_if_enabled(audit, username):
+    try:
+        mail_enabled = config.get('SMTP_ENABLED')
+        if mail_enabled == u'1':
+            _email_batch_source_update_results(audit, username)
+    except ConfigException:
+        logger.debug("Skipping collection file upload confirmation email")
 
 
 def _parse_sources_from_csv_upload(filepath):
@@ -173,120 +227,7 @@ def _parse_sources_from_csv_upload(filepath):
         return sources_to_update, sources_to_create
 
 
-def _update_source_worker2(source_info):
-    # worker function to help update sources NOT in parallel
-    user_mc = user_admin_mediacloud_client()
-    media_id = source_info['media_id']
-    # logger.debug("Updating media {}".format(media_id))
-    source_no_metadata_no_id = {k: v for k, v in list(source_info.items()) if k != 'media_id'
-                                and k not in SOURCE_LIST_CSV_METADATA_PROPS}
-    response = user_mc.mediaUpdate(media_id, source_no_metadata_no_id)
-    return response
-
-
-@executor.job
-def _update_source_job(source_info):
-    # worker function to help update sources in parallel
-    user_mc = user_admin_mediacloud_client()
-    media_id = source_info['media_id']
-    logger.debug("Updating media {}".format(media_id))
-    status_fields = ['status', 'status_message']
-    source_no_metadata_no_id = {k: v for k, v in list(source_info.items()) if k != 'media_id'
-                                and k not in [SOURCE_LIST_CSV_METADATA_PROPS + status_fields]}
-    response = user_mc.mediaUpdate(media_id, source_no_metadata_no_id)
-    source_info['response'] = response
-    return source_info
-
-
-@executor.job
-def _create_media_job(media_list):
-    user_mc = user_admin_mediacloud_client()
-    return user_mc.mediaCreate(media_list)
-
-
-def _create_or_update_sources(source_list_from_csv, create_new):
-    time_start = time.time()
-    successful = []
-    errors = []
-    # logger.debug("@@@@@@@@@@@@@@@@@@@@@@")
-    # logger.debug("going to create or update these sources%s", source_list_from_csv)
-
-    # first split the list into the difference operations to perform so we can parallelize
-    results = []
-    sources_to_create = []
-    sources_to_update = []
-    for src in source_list_from_csv:
-        if create_new:
-            sources_to_create.append(src)
-        else:
-            sources_to_update.append(src)
-    # process all the entries we think are creations in one batch call
-    if len(sources_to_create) > 0:
-        # remove metadata so they don't save badly (will do metadata later)
-        sources_to_create_no_metadata = []
-        for src in sources_to_create:
-            sources_to_create_no_metadata.append(
-                {k: v for k, v in list(src.items()) if k not in SOURCE_LIST_CSV_METADATA_PROPS})
-        # parallelize media creation to make it faster
-        chunk_size = 5  # @ 10, each call takes over a minute; @ 5 each takes around ~40 secs
-        media_to_create_batches = [sources_to_create_no_metadata[x:x + chunk_size]
-                                   for x in range(0, len(sources_to_create_no_metadata), chunk_size)]
-        creation_batched_responses = _create_media_job.map(media_to_create_batches, chunksize=chunk_size)
-        creation_responses = []
-        for responses in creation_batched_responses:
-            creation_responses = creation_responses + responses
-        # now group creation attempts by outcome
-        for idx, response in enumerate(creation_responses):
-            src = sources_to_create[idx]
-            src['status'] = 'found and updated this source' if response['status'] == 'existing' else response['status']
-            src['media_id'] = response['media_id'] if 'media_id' in response else None
-            src['name'] = response['url']
-            if 'error' in response:
-                src['status_message'] = response['error']
-            else:
-                src['status_message'] = src['status']
-            if response['status'] != 'error':
-                successful.append(src)
-            else:
-                errors.append(src)
-            results.append(src)
-    # process all the entries we think are updates in parallel so it happens quickly
-    if len(sources_to_update) > 0:
-        sources_to_update = _update_source_job.map(sources_to_update)
-        for m in sources_to_update:
-            response = m['response']
-            src['status'] = 'existing' if response['success'] == 1 else 'error'
-            src['status_message'] = 'unable to update existing source' if \
-                response['success'] == 0 else 'updated existing source'
-            if response['success'] == 1:
-                successful.append(src)
-            else:
-                errors.append(src)
-            results.append(src)
-
-    time_info = time.time()
-    # logger.debug("successful :  %s", successful)
-    # logger.debug("errors :  %s", errors)
-    # for new sources we have status, media_id, url, error in result, merge with source_list so we have
-    # metadata and the fields we need for the return
-    if create_new:
-        info_by_url = {source['url']: source for source in successful}
-        for source in source_list_from_csv:
-            if source['url'] in info_by_url:
-                info_by_url[source['url']].update(source)
-        update_metadata_for_sources(info_by_url)
-        return results, list(info_by_url.values()), errors
-
-    # if a successful update, just return what we have, success
-    update_metadata_for_sources(successful)
-    time_end = time.time()
-    logger.debug("    time_create_update: {}".format(time_end - time_start))
-    logger.debug("      info: {}".format(time_info - time_start))
-    logger.debug("      metadata: {}".format(time_end - time_info))
-    return results, successful, errors
-
-
-def _email_batch_source_update_results(audit_feedback):
+def _email_batch_source_update_results(audit_feedback, username):
     email_title = "Source Batch Updates"
     content_title = "You just uploaded {} sources to a collection.".format(len(audit_feedback))
     updated_sources = []
@@ -298,7 +239,7 @@ def _email_batch_source_update_results(audit_feedback):
     action_url = "https://sources.mediacloud.org/#/login"
     # send an email confirmation
     send_html_email(email_title,
-                    [user_name(), 'noreply@mediacloud.org'],
+                    [username, 'noreply@mediacloud.org'],
                     render_template("emails/source_batch_upload_ack.txt",
                                     content_title=content_title, content_body=content_body, action_text=action_text,
                                     action_url=action_url),
@@ -306,43 +247,3 @@ def _email_batch_source_update_results(audit_feedback):
                                     email_title=email_title, content_title=content_title, content_body=content_body,
                                     action_text=action_text, action_url=action_url)
                     )
-
-
-# worker for process pool to send tags requests in parallel
-@executor.job
-def _tag_media_job(tags):
-    user_mc = user_admin_mediacloud_client()
-    user_mc.tagMedia(tags=tags, clear_others=True)  # make sure to clear any other values set in this metadata tag set
-
-
-# this only adds/replaces metadata with values (does not remove)
-def update_metadata_for_sources(source_list):
-    tags = []
-    tag_sets_id_2_name_lookup = {
-        TagSetDiscoverer().media_pub_country_set: 'pub_country',
-        TagSetDiscoverer().media_pub_state_set: 'pub_state',
-        TagSetDiscoverer().media_primary_language_set: 'primary_language',
-        TagSetDiscoverer().media_subject_country_set: 'subject_country',
-        TagSetDiscoverer().media_type_set: 'media_type',
-    }
-    for tags_id in TagSetDiscoverer().media_metadata_sets():
-        col_name = tag_sets_id_2_name_lookup[tags_id]
-        tag_codes = tags_in_tag_set(TOOL_API_KEY, tags_id)
-        for source in source_list:
-            if col_name in source:
-                metadata_tag_name = source[col_name]
-                if metadata_tag_name not in ['', None]:
-                    # hack until we have a better match check
-                    if col_name == 'pub_country':  # template pub_###
-                        matching = [t for t in tag_codes if t['tag'] == 'pub_' + metadata_tag_name]
-                    else:
-                        matching = [t for t in tag_codes if t['tag'] == metadata_tag_name]
-
-                    if matching and matching not in ['', None]:
-                        metadata_tag_id = matching[0]['tags_id']
-                        logger.debug('found metadata to add %s', metadata_tag_id)
-                        tags.append(MediaTag(source['media_id'], tags_id=metadata_tag_id, action=TAG_ACTION_ADD))
-    # now do all the tags in parallel batches so it happens quickly
-    if len(tags) > 0:
-        chunks = [tags[x:x + 50] for x in range(0, len(tags), 50)]  # do 50 tags in each request
-        _tag_media_job.map(chunks)
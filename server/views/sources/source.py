@@ -129,7 +129,7 @@ def api_media_source_details(media_id):
         info['scrape_status'] = None
     add_user_favorite_flag_to_sources([info])
     add_user_favorite_flag_to_collections(info['media_source_tags'])
-    analytics_db.increment_count(analytics_db.TYPE_MEDIA, media_id, analytics_db.ACTION_SOURCE_MGR_VIEW)
+    analytics_db.queue_increment_count(analytics_db.TYPE_MEDIA, media_id, analytics_db.ACTION_SOURCE_MGR_VIEW)
     return jsonify(info)
 
 
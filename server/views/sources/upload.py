@@ -0,0 +1,240 @@
+"""
+The back-end work behind uploading a CSV of sources to a collection: create the new sources, update the existing ones,
+and then tag them all with their metadata. Calls to the back-end go through one thread pool shared by all uploads,
+and each upload only has a few calls going at once, so a big upload can't starve everyone else. Source creation is
+slow and varies a lot (tens of seconds per chunk), so the size of those chunks adapts to how long they are taking.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from mediacloud.tags import MediaTag, TAG_ACTION_ADD
+
+from server import TOOL_API_KEY
+from server.util.csv import SOURCE_LIST_CSV_METADATA_PROPS
+from server.util.tags import TagSetDiscoverer, tag_ids_by_name_in_tag_set
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_WORKERS = 8              # threads for calls to the back-end, shared by all the uploads going on
+MAX_IN_FLIGHT = 4               # how many back-end calls one upload can have going at once
+
+CREATE_CHUNK_SIZE = 5           # how many sources to create in the first request (each chunk used to take ~40 secs)
+CREATE_MIN_CHUNK_SIZE = 1
+CREATE_MAX_CHUNK_SIZE = 25
+CREATE_TARGET_SECS = 30         # try to size the creation chunks so each request takes about this long
+UPDATE_CHUNK_SIZE = 1           # there isn't a bulk update call, so these go one at a time
+MEDIA_TAG_CHUNK_SIZE = 50       # how many media tags to send in each request
+
+STAGE_CREATE = 'create'
+STAGE_UPDATE = 'update'
+STAGE_METADATA = 'metadata'
+
+_STATUS_FIELDS = ['status', 'status_message']
+
+_call_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='source-upload')
+
+
+class AdaptiveChunkSize:
+    """
+    Picks how many items to send in the next request, based on how long the last ones took per item. It moves part of
+    the way towards the size that would hit `target_secs` each time (so one odd request doesn't swing it too far), and
+    halves the size after a failure.
+    """
+
+    def __init__(self, initial, minimum, maximum, target_secs):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_secs = target_secs
+
+    def record(self, items, secs, failed=False):
+        if failed:
+            new_size = self.size // 2
+        else:
+            ideal = self.maximum if secs <= 0 else int(self.target_secs * items / secs)
+            new_size = (self.size + ideal) // 2
+        self.size = max(self.minimum, min(self.maximum, new_size))
+
+
+def _timed_call(fn, chunk):
+    start = time.time()
+    result = fn(chunk)
+    return result, time.time() - start
+
+
+def _process_in_chunks(items, work_fn, on_chunk_done, chunk_size):
+    """
+    Run `work_fn` on chunks of the items in the shared pool, with at most `MAX_IN_FLIGHT` going at once.
+    :param chunk_size: a fixed number of items per chunk, or an `AdaptiveChunkSize`
+    :param on_chunk_done: called (in this thread) with the chunk, the result, and the exception if it failed
+    """
+    position = 0
+    in_flight = {}
+    while (position < len(items)) or in_flight:
+        while (position < len(items)) and (len(in_flight) < MAX_IN_FLIGHT):
+            size = chunk_size.size if isinstance(chunk_size, AdaptiveChunkSize) else chunk_size
+            chunk = items[position:position + size]
+            position += size
+            in_flight[_call_pool.submit(_timed_call, work_fn, chunk)] = chunk
+        done, _ = wait(list(in_flight.keys()), return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk = in_flight.pop(future)
+            try:
+                result, secs = future.result()
+                error = None
+            except Exception as e:
+                result, secs, error = None, None, e
+            if isinstance(chunk_size, AdaptiveChunkSize):
+                chunk_size.record(len(chunk), secs, failed=error is not None)
+            on_chunk_done(chunk, result, error)
+
+
+class SourceUpload:
+    """
+    One upload of sources from a CSV. Call `run`, which returns when it is all done; pass in `on_progress` to hear
+    about each chunk of sources as it is finished (it is called with the stage and the rows that were just done).
+    """
+
+    def __init__(self, user_mc, on_progress=None):
+        self.user_mc = user_mc
+        self.on_progress = on_progress
+        self.successful = []
+        self.errors = []
+        self.results = []   # every row, for the audit
+
+    def _finished(self, stage, rows):
+        for src in rows:
+            self.results.append(src)
+            (self.successful if src['status'] != 'error' else self.errors).append(src)
+        if self.on_progress is not None:
+            self.on_progress(stage, rows)
+
+    def run(self, sources_to_create, sources_to_update):
+        """
+        :return: the successful rows and the rows that failed
+        """
+        created = self._create_sources(sources_to_create) if len(sources_to_create) > 0 else []
+        updated = self._update_sources(sources_to_update) if len(sources_to_update) > 0 else []
+        for src in created + updated:
+            if src.get('media_id') is not None:
+                src['media_id'] = int(src['media_id'])  # make sure they are ints so no-dupes logic works on front end
+        self._note_metadata_errors(created + updated,
+                                   update_metadata_for_sources(self.user_mc, created + updated, self.on_progress))
+        return self.successful, self.errors
+
+    def _create_sources(self, sources):
+        created = []
+
+        def _create(chunk):
+            # remove metadata so they don't save badly (will do metadata later)
+            return self.user_mc.mediaCreate([{k: v for k, v in src.items() if k not in SOURCE_LIST_CSV_METADATA_PROPS}
+                                             for src in chunk])
+
+        def _chunk_done(chunk, responses, error):
+            rows = []
+            for idx, src in enumerate(chunk):
+                if error is not None:
+                    src['status'] = 'error'
+                    src['status_message'] = str(error)
+                    rows.append(src)
+                    continue
+                response = responses[idx]
+                src['status'] = 'found and updated this source' if response['status'] == 'existing' \
+                    else response['status']
+                src['media_id'] = response['media_id'] if 'media_id' in response else None
+                src['name'] = response['url']
+                src['status_message'] = response['error'] if 'error' in response else src['status']
+                if response['status'] != 'error':
+                    created.append(src)
+                rows.append(src)
+            self._finished(STAGE_CREATE, rows)
+
+        chunk_size = AdaptiveChunkSize(CREATE_CHUNK_SIZE, CREATE_MIN_CHUNK_SIZE, CREATE_MAX_CHUNK_SIZE,
+                                       CREATE_TARGET_SECS)
+        _process_in_chunks(sources, _create, _chunk_done, chunk_size)
+        return created
+
+    def _update_sources(self, sources):
+        updated = []
+
+        def _update(chunk):
+            return [self.user_mc.mediaUpdate(src['media_id'],
+                                             {k: v for k, v in src.items() if k != 'media_id'
+                                              and k not in SOURCE_LIST_CSV_METADATA_PROPS + _STATUS_FIELDS})
+                    for src in chunk]
+
+        def _chunk_done(chunk, responses, error):
+            for idx, src in enumerate(chunk):
+                success = (error is None) and (responses[idx]['success'] == 1)
+                src['status'] = 'existing' if success else 'error'
+                src['status_message'] = 'updated existing source' if success else 'unable to update existing source'
+                if success:
+                    updated.append(src)
+            self._finished(STAGE_UPDATE, chunk)
+
+        _process_in_chunks(sources, _update, _chunk_done, UPDATE_CHUNK_SIZE)
+        return updated
+
+    @staticmethod
+    def _note_metadata_errors(sources, metadata_errors):
+        # the sources were saved, but let people know if their metadata wasn't
+        for error in metadata_errors:
+            failed_media_ids = set(error['media_ids'])
+            for src in sources:
+                if src.get('media_id') in failed_media_ids:
+                    src['metadata_error'] = error['message']
+
+
+def _tag_media_in_batches(user_mc, tags, on_progress=None):
+    """
+    Send the media tags in chunks, a few requests at a time.
+    :return: a list of the chunks that failed, each with the media_ids in it and the error message
+    """
+    errors = []
+
+    def _tag_media(chunk):
+        # make sure to clear any other values set in this metadata tag set
+        return user_mc.tagMedia(tags=chunk, clear_others=True)
+
+    def _chunk_done(chunk, _, error):
+        if error is not None:
+            logger.error("Couldn't tag {} media: {}".format(len(chunk), error))
+            errors.append({'media_ids': [t.media_id for t in chunk], 'message': str(error)})
+        if on_progress is not None:
+            on_progress(STAGE_METADATA, [])
+
+    _process_in_chunks(tags, _tag_media, _chunk_done, MEDIA_TAG_CHUNK_SIZE)
+    return errors
+
+
+# this only adds/replaces metadata with values (does not remove)
+def update_metadata_for_sources(user_mc, source_list, on_progress=None):
+    """
+    :return: a list of the media tag chunks that couldn't be saved (see `_tag_media_in_batches`)
+    """
+    tag_sets_id_2_name_lookup = {
+        TagSetDiscoverer().media_pub_country_set: 'pub_country',
+        TagSetDiscoverer().media_pub_state_set: 'pub_state',
+        TagSetDiscoverer().media_primary_language_set: 'primary_language',
+        TagSetDiscoverer().media_subject_country_set: 'subject_country',
+        TagSetDiscoverer().media_type_set: 'media_type',
+    }
+    # (column, tag name prefix, tag name -> tags_id) for each metadata set; pub_country tags are named "pub_###"
+    matchers = []
+    for tag_sets_id in TagSetDiscoverer().media_metadata_sets():
+        col_name = tag_sets_id_2_name_lookup[tag_sets_id]
+        prefix = 'pub_' if col_name == 'pub_country' else ''
+        matchers.append((col_name, prefix, tag_ids_by_name_in_tag_set(TOOL_API_KEY, tag_sets_id)))
+    tags = []
+    for source in source_list:
+        for col_name, prefix, tag_ids in matchers:
+            metadata_tag_name = source.get(col_name)
+            if metadata_tag_name in ['', None]:
+                continue
+            metadata_tag_id = tag_ids.get(prefix + metadata_tag_name)
+            if metadata_tag_id is not None:
+                tags.append(MediaTag(source['media_id'], tags_id=metadata_tag_id, action=TAG_ACTION_ADD))
+    # now do all the tags in parallel batches so it happens quickly
+    if len(tags) == 0:
+        return []
+    return _tag_media_in_batches(user_mc, tags, on_progress)
@@ -27,9 +27,10 @@ def _cached_word_count(user_mc_key, q, fq, num_words, sample_size=WORD_COUNT_SAM
     words = [w['term'] for w in word_data]
     word2vec_data = base_apicache.word2vec_google_2d(words)
     try:
-        for i in range(len(word2vec_data)):
-            word_data[i]['google_w2v_x'] = word2vec_data[i]['x']
-            word_data[i]['google_w2v_y'] = word2vec_data[i]['y']
+        for w in word_data:
+            if w['term'] in word2vec_data:
+                w['google_w2v_x'] = word2vec_data[w['term']]['x']
+                w['google_w2v_y'] = word2vec_data[w['term']]['y']
     except KeyError as e:
         logger.warning("Didn't get valid data back from word2vec call")
         logger.exception(e)
@@ -0,0 +1,51 @@
+import threading
+import unittest
+from unittest import mock
+
+from server import app
+import server.views.topics.apicache as apicache
+
+TIMESPAN = {'timespans_id': 1, 'start_date': '2020-01-01 00:00:00', 'end_date': '2020-02-01 00:00:00',
+            'period': 'overall'}
+
+
+class _CountingClient:
+    # stands in for the user's Media Cloud client, and counts the timespan list calls from any thread
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def topicTimespanList(self, _topics_id, snapshots_id=None, foci_id=None):
+        with self._lock:
+            self.calls.append((snapshots_id, foci_id))
+        return [dict(TIMESPAN, timespans_id=100 + (foci_id or 0))]
+
+
+class TopicTimespanListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = _CountingClient()
+        patcher = mock.patch.object(apicache, 'user_mediacloud_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testMemoizedWithinARequest(self):
+        with app.test_request_context('/'):
+            first = apicache.topic_timespan_list(1, 2, 3)
+            assert apicache.topic_timespan_list('1', '2', '3') == first
+        assert self.client.calls == [(2, 3)]
+        with app.test_request_context('/'):
+            apicache.topic_timespan_list(1, 2, 3)  # but not across requests
+        assert self.client.calls == [(2, 3), (2, 3)]
+
+    def testOneCallPerDistinctFocus(self):
+        foci = [{'foci_id': 5}, {'foci_id': 6}, {'foci_id': 5}, {'foci_id': 7}, {'foci_id': 6}]
+        with app.test_request_context('/?snapshotId=2'):
+            matches = apicache.matching_timespans_in_foci(1, TIMESPAN, foci)
+        assert sorted(f for _, f in self.client.calls) == [5, 6, 7]
+        assert [m['timespans_id'] for m in matches] == [105, 106, 105, 107, 106]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,10 @@
 import logging
-from flask import request
+import threading
+from flask import request, g, has_request_context
 from datetime import datetime
 import mediacloud.error
 
-from server import mc, TOOL_API_KEY
+from server import mc, TOOL_API_KEY, executor
 from server.views import WORD_COUNT_SAMPLE_SIZE, WORD_COUNT_UI_NUM_WORDS
 from server.cache import cache
 from server.util.tags import TagDiscoverer
@@ -17,6 +18,8 @@ import server.views.apicache as base_apicache
 
 logger = logging.getLogger(__name__)
 
+_timespan_lists_lock = threading.Lock()  # guards the per-request memo in topic_timespan_list
+
 WORD_COUNT_DOWNLOAD_COLUMNS = ['term', 'stem', 'count', 'sample_size', 'ratio']
 
 # the parameters actually accepted by the lower-level topicStoryList API call
@@ -78,6 +81,26 @@ def topic_story_count(user_mc_key, topics_id, **kwargs):
     return _cached_topic_story_count(user_mc_key, topics_id, **merged_args)
 
 
+def topic_story_counts(user_mc_key, topics_id, kwargs_list):
+    """
+    Get a batch of filtered story counts within a topic at once (ie. one for each focus in a focal set). Each set of
+    kwargs is merged with the filters in the request, the same as `topic_story_count`.
+    :return: a list of story count results, in the same order as the kwargs
+    """
+    snapshots_id, timespans_id, foci_id, q = filters_from_args(request.args)
+    calls = []
+    for kwargs in kwargs_list:
+        merged_args = {
+            'snapshots_id': snapshots_id,
+            'timespans_id': timespans_id,
+            'foci_id': foci_id,
+            'q': q
+        }
+        merged_args.update(kwargs)
+        calls.append(((user_mc_key, topics_id), merged_args))
+    return base_apicache.cached_batch(_cached_topic_story_count, calls)
+
+
 @cache.cache_on_arguments()
 def _cached_topic_story_count(user_mc_key, topics_id, **kwargs):
     """
@@ -193,21 +216,37 @@ def topic_word_counts(user_mc_key, topics_id, **kwargs):
     # and now add in word2vec model position data
     if len(words) > 0:
         google_word2vec_data = base_apicache.word2vec_google_2d(words)
-        for i in range(len(google_word2vec_data)):
-            word_data[i]['google_w2v_x'] = google_word2vec_data[i]['x']
-            word_data[i]['google_w2v_y'] = google_word2vec_data[i]['y']
         topic_word2vec_data = _word2vec_topic_2d_results(topics_id, snapshots_id, words)
-        for i in range(len(topic_word2vec_data)):
-            word_data[i]['w2v_x'] = topic_word2vec_data[i]['x']
-            word_data[i]['w2v_y'] = topic_word2vec_data[i]['y']
+        for w in word_data:
+            if w['term'] in google_word2vec_data:
+                w['google_w2v_x'] = google_word2vec_data[w['term']]['x']
+                w['google_w2v_y'] = google_word2vec_data[w['term']]['y']
+            if w['term'] in topic_word2vec_data:
+                w['w2v_x'] = topic_word2vec_data[w['term']]['x']
+                w['w2v_y'] = topic_word2vec_data[w['term']]['y']
 
     return word_data
 
 
 def _word2vec_topic_2d_results(topics_id, snapshots_id, words):
-    # can't cache this because the first time it is called we usually don't have results
-    word2vec_results = wordembeddings.topic_2d(topics_id, snapshots_id, words)
-    return word2vec_results
+    """
+    :return: a dict of word => position in the topic's own word2vec model, for the words the model knows
+    """
+    def fetch(words_to_fetch):
+        return wordembeddings.topic_2d(topics_id, snapshots_id, words_to_fetch)
+    if snapshots_id is None:
+        # this means the latest snapshot, which changes, so we can't cache it
+        positions, _ = base_apicache.word2vec_positions_by_word(words, fetch(words))
+        return positions
+    # the first time this is called the model often isn't ready, but that just means no results to cache yet
+    return base_apicache.word2vec_2d_positions(_cached_word2vec_topic_2d_term, (topics_id, snapshots_id), fetch,
+                                               words)
+
+
+@cache.cache_on_arguments()
+def _cached_word2vec_topic_2d_term(topics_id, snapshots_id, word):
+    results = wordembeddings.topic_2d(topics_id, snapshots_id, [word])
+    return results[0] if len(results) > 0 else None
 
 
 def topic_similar_words(topics_id, word):
@@ -310,9 +349,44 @@ def topic_focal_set(user_mc_key, topics_id, snapshots_id, focal_sets_id):
             return fs
     raise ValueError("Unknown subtopic set id of {}".format(focal_sets_id))
 
+# topics change state as they run, and what you see depends on your permissions, so these aren't cached
+def topic_batch(topics_ids):
+    """
+    Fetch a list of topics (ie. a user's favorites) in parallel.
+    :return: the topics, in the same order as the ids
+    """
+    jobs = [{'index': idx, 'topics_id': topics_id} for idx, topics_id in enumerate(topics_ids)]
+    results = [None] * len(jobs)
+    for job_result in _topic_job.map(jobs):
+        results[job_result['index']] = job_result['topic']
+    return results
+
+
+@executor.job
+def _topic_job(job):
+    user_mc = user_mediacloud_client()
+    return {'index': job['index'], 'topic': user_mc.topic(job['topics_id'])}
+
+
 #snapshots aka versions can be initially empty, or paused then resumed, generating new timespans. Hence, don't cache
 def topic_timespan_list(topics_id, snapshots_id=None, foci_id=None):
-    # this includes the user_mc_key as a first param so the cache works right
+    # not cached across requests (see above), but one request can ask for the same list a few times, so remember them
+    # until the request is done. Executor jobs might not see the same `g`, so fan-outs should ask for each distinct list
+    # once themselves (see `matching_timespans_in_foci`) rather than relying on this.
+    if not has_request_context():
+        return _topic_timespan_list(topics_id, snapshots_id, foci_id)
+    key = tuple(None if v is None else str(v) for v in [topics_id, snapshots_id, foci_id])
+    with _timespan_lists_lock:
+        memo = g.setdefault('topic_timespan_lists', {})
+        if key in memo:
+            return memo[key]
+    timespans = _topic_timespan_list(topics_id, snapshots_id, foci_id)
+    with _timespan_lists_lock:
+        memo[key] = timespans
+    return timespans
+
+
+def _topic_timespan_list(topics_id, snapshots_id, foci_id):
     user_mc = user_mediacloud_client()
     timespans = user_mc.topicTimespanList(topics_id, snapshots_id=snapshots_id, foci_id=foci_id)
     return timespans
@@ -423,15 +497,13 @@ def matching_timespans_in_foci(topics_id, timespan_to_match, foci):
     range in each subtopic within the set.  This helper does that annoying work for you.
     """
     snapshots_id, _timespans_id, _foci_id, _q = filters_from_args(request.args)
-    timespans = []
-    for focus in foci:
-        # find the matching timespan within this focus
-        snapshot_timespans = topic_timespan_list(topics_id, snapshots_id=snapshots_id, foci_id=focus['foci_id'])
-        timespan = _matching_timespan(timespan_to_match, snapshot_timespans)
-        timespans.append(timespan)
-#        if timespan is None:
-#            return json_error_response('Couldn\'t find a matching timespan in the '+focus.name+' focus')
-    return timespans
+    # get the timespans in each different focus once, all in parallel, then find the matching one within each focus
+    foci_ids = list(dict.fromkeys(focus['foci_id'] for focus in foci))
+    timespan_lists = base_apicache.parallel_batch(topic_timespan_list,
+                                                  [((topics_id,), {'snapshots_id': snapshots_id, 'foci_id': foci_id})
+                                                   for foci_id in foci_ids])
+    timespans_by_focus = dict(zip(foci_ids, timespan_lists))
+    return [_matching_timespan(timespan_to_match, timespans_by_focus[focus['foci_id']]) for focus in foci]
 
 
 def _matching_timespan(timespan_to_match, timespans_to_search):
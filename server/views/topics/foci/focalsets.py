@@ -6,6 +6,7 @@ from server import app
 from server.util.request import arguments_required, api_error_handler, filters_from_args, json_error_response
 from server.auth import user_mediacloud_client, user_mediacloud_key
 from server.views.topics import apicache
+import server.views.apicache as base_apicache
 
 logger = logging.getLogger(__name__)
 
@@ -80,12 +81,14 @@ def topic_focal_set_split_stories_compare(topics_id, focal_sets_id):
         focal_set = apicache.topic_focal_set(user_mediacloud_key(), topics_id, snapshots_id, focal_sets_id)
     except ValueError as e:
         return json_error_response(str(e))
-    # collect the story split counts for each foci
+    # collect the story split counts for each foci, in parallel
     timespans = apicache.matching_timespans_in_foci(topics_id, base_timespan, focal_set['foci'])
-    for idx in range(0, len(timespans)):
-        data = apicache.topic_split_story_counts(user_mediacloud_key(), topics_id, snapshots_id=snapshots_id,
-                                                 timespans_id=timespans[idx]['timespans_id'])
-        focal_set['foci'][idx]['split_story_counts'] = data
+    split_counts = base_apicache.parallel_batch(apicache.topic_split_story_counts,
+                                                [((user_mediacloud_key(), topics_id),
+                                                  {'snapshots_id': snapshots_id, 'timespans_id': t['timespans_id']})
+                                                 for t in timespans])
+    for focus, data in zip(focal_set['foci'], split_counts):
+        focus['split_story_counts'] = data
     return jsonify(focal_set)
 
 
@@ -96,16 +99,13 @@ def _add_story_counts_to_foci(topics_id, focal_sets):
         base_timespan = base_snapshot_timespan(topics_id)
     except ValueError as e:
         return json_error_response(str(e))
-    # now find the story count in each foci in this
-    for fs in focal_sets:
-        timespans = apicache.matching_timespans_in_foci(topics_id, base_timespan, fs['foci'])
-        for idx in range(0, len(timespans)):
-            timespan = timespans[idx]
-            focus = fs['foci'][idx]
-            foci_story_count = apicache.topic_story_count(user_mediacloud_key(), topics_id,
-                                                          snapshots_id=snapshots_id,
-                                                          timespans_id=timespan['timespans_id'],
-                                                          q=q,
-                                                          foci_id=focus['foci_id'])['count']
-            focus['story_count'] = foci_story_count
+    # now find the story count in each foci in all the sets at once (in parallel)
+    all_foci = [focus for fs in focal_sets for focus in fs['foci']]
+    timespans = apicache.matching_timespans_in_foci(topics_id, base_timespan, all_foci)
+    story_counts = apicache.topic_story_counts(user_mediacloud_key(), topics_id,
+                                               [{'snapshots_id': snapshots_id, 'timespans_id': timespan['timespans_id'],
+                                                 'q': q, 'foci_id': focus['foci_id']}
+                                                for focus, timespan in zip(all_foci, timespans)])
+    for focus, story_count in zip(all_foci, story_counts):
+        focus['story_count'] = story_count['count']
     return jsonify(focal_sets)
@@ -4,7 +4,7 @@ import flask_login
 
 from server import app
 from server.auth import user_mediacloud_key, user_admin_mediacloud_client
-from server.util import csv
+from server.util import csv, pager
 from server.views.topics import TOPIC_MEDIA_CSV_PROPS
 import server.views.topics.apicache as apicache
 from server.util.request import filters_from_args, api_error_handler
@@ -79,20 +79,22 @@ def stream_media_list_csv(user_mc_key, topic, filename, **kwargs):
 
 
 def _stream_media_by_page(user_mc_key, topics_id, props, metadata_fields, **kwargs):
-    yield ','.join(props) + '\n'  # first send the column names
-    more_media = True
-    while more_media:
-        page = apicache.topic_media_list_page(user_mc_key, topics_id, **kwargs)
+    yield from csv.stream_csv_chunks(_media_by_page(user_mc_key, topics_id, metadata_fields, **kwargs), props)
+
+
+# generator you can use to handle a long list of media one by one, with the metadata labels filled in
+def _media_by_page(user_mc_key, topics_id, metadata_fields, **kwargs):
+    def fetch_page(link_id):
+        page_args = kwargs.copy()
+        if link_id is not None:
+            page_args['link_id'] = link_id
+        return apicache.topic_media_list_page(user_mc_key, topics_id, **page_args)
+    # the next page is fetched in the background while we work on this one
+    pages = pager.prefetching_pages(fetch_page, kwargs.get('link_id'), lambda page: page['link_ids'].get('next'))
+    for page in pages:
         page_media = page['media']
         for m in page_media:
             for meta_field in metadata_fields:
                 metadata = m['metadata']
                 m[meta_field] = metadata[meta_field]['label'] if metadata[meta_field] is not None else None
-            row = csv.dict2row(props, m)
-            row_string = ','.join(row) + '\n'
-            yield row_string
-        if 'next' in page['link_ids']:
-            kwargs['link_id'] = page['link_ids']['next']
-            more_media = True
-        else:
-            more_media = False
+            yield m
@@ -3,9 +3,9 @@ import flask_login
 from flask import jsonify, request, Response
 import mediacloud
 import mediacloud.error
-import concurrent.futures
 
 import server.util.csv as csv
+import server.util.pager as pager
 import server.util.tags as tag_util
 import server.views.topics.apicache as apicache
 import server.views.apicache as base_apicache
@@ -110,20 +110,21 @@ def stream_story_list_csv(user_key, filename, topic, **kwargs):
 
 # generator you can use to handle a long list of stories row by row (one row per story)
 def _topic_story_list_by_page_as_csv_row(user_key, topics_id, props, **kwargs):
-    yield ','.join(props) + '\n'  # first send the column names
+    yield from csv.stream_csv_chunks(_topic_story_list_by_page(user_key, topics_id, **kwargs), props)
+
+
+# generator you can use to handle a long list of stories one by one, with the extra columns for the csv filled in
+def _topic_story_list_by_page(user_key, topics_id, **kwargs):
     include_all_url_shares = kwargs['include_all_url_shares'] if 'include_all_url_shares' in kwargs else False
     story_count = 0
-    link_id = 0
-    more_pages = True
-    yet_to_hit_story_limit = True
     has_story_limit = ('story_limit' in kwargs) and (kwargs['story_limit'] is not None)
-    # page through the story list results, until we run out or we hit the user's desired limit
-    while more_pages and ((not has_story_limit) or (has_story_limit and yet_to_hit_story_limit)):
-        page = _topic_story_page_with_media(user_key, topics_id, link_id, **kwargs)
-        if 'next' in page['link_ids']:
-            link_id = page['link_ids']['next']
-        else:
-            more_pages = False
+    media_lookup = {}  # shared across pages, so we only look up each media source once per download
+    # page through the story list results, until we run out or we hit the user's desired limit (the next page is
+    # fetched in the background while we work on this one)
+    def fetch_page(link_id):
+        return _topic_story_page_with_media(user_key, topics_id, link_id, media_lookup, **kwargs)
+    pages = pager.prefetching_pages(fetch_page, 0, lambda page: page['link_ids'].get('next'))
+    for page in pages:
         for s in page['stories']:
             if include_all_url_shares:
                 topic_seed_queries = kwargs['topic_seed_queries']
@@ -136,21 +137,14 @@ def _topic_story_list_by_page_as_csv_row(user_key, topics_id, props, **kwargs):
                     s[prefix + "author_count"] = item['author_count']
             # first foci down to just the readable names
             s['subtopics'] = ["{}: {}".format(f['focal_set_name'], f['name']) for f in s['foci']]
-            cleaned_row = csv.dict2row(props, s)
-            row_string = ','.join(cleaned_row) + '\n'
-            yield row_string
+            yield s
         story_count += len(page['stories'])
-        yet_to_hit_story_limit = has_story_limit and (story_count < int(kwargs['story_limit']))
-
-
-def _media_info_worker(info):
-    return base_apicache.get_media_with_key(info['user_key'], info['media_id'])
+        if has_story_limit and (story_count >= int(kwargs['story_limit'])):
+            break
 
 
 # generator you can use to do something for each page of story results
-def _topic_story_page_with_media(user_key, topics_id, link_id, **kwargs):
-    media_lookup = {}
-
+def _topic_story_page_with_media(user_key, topics_id, link_id, media_lookup, **kwargs):
     include_media_metadata = ('media_metadata' in kwargs) and (kwargs['media_metadata'] == '1')
     include_story_tags = ('story_tags' in kwargs) and (kwargs['story_tags'] == '1')
 
@@ -160,17 +154,18 @@ def _topic_story_page_with_media(user_key, topics_id, link_id, **kwargs):
 
     if len(story_page['stories']) > 0:  # be careful to not construct malformed query if no story ids
 
-        # build a media lookup table in parallel so it is faster
+        # add any media we haven't seen yet on this download to the lookup table (in one batch so it is faster)
         if include_media_metadata:
-            with concurrent.futures.ProcessPoolExecutor() as executor:
-                media_ids = set([s['media_id'] for s in story_page['stories']])
-                jobs = [{'user_key': user_key, 'media_id': mid} for mid in media_ids]
-                job_results = executor.map(_media_info_worker, jobs)  # blocks until they are all done
-                media_lookup = {j['media_id']: j for j in job_results}
+            new_media_ids = set([s['media_id'] for s in story_page['stories']]) - set(media_lookup.keys())
+            media_lookup.update(base_apicache.get_media_batch_with_key(user_key, new_media_ids))
 
         if include_story_tags:
             story_ids = [str(s['stories_id']) for s in story_page['stories']]
             stories_with_tags = apicache.story_list(user_key, 'stories_id:(' + " ".join(story_ids) + ")", args['limit'])
+            # build lookup for id => story for all stories in stories with tags (non topic results)
+            stories_with_tags_by_id = {st['stories_id']: st for st in stories_with_tags}
+            theme_version_tag_ids = frozenset(tag_util.TagDiscoverer().nyt_themes_version_tags)
+            themes_tag_sets_id = tag_util.TagSetDiscoverer().nyt_themes_set
 
         # update story info for each story in the page, put it into the [stories] field, send updated page with
         # stories back
@@ -183,23 +178,15 @@ def _topic_story_page_with_media(user_key, topics_id, link_id, **kwargs):
                 for k, v in media['metadata'].items():
                     s['media_{}'.format(k)] = v['label'] if v is not None else None
 
-            # build lookup for id => story for all stories in stories with tags (non topic results)
-            if include_story_tags:
-                for st in stories_with_tags:
-                    if s['stories_id'] == st['stories_id']:
-                        s.update(st)
-                        foci_names = [f['name'] for f in s['foci']]
-                        s['subtopics'] = ", ".join(foci_names)
-                        s['themes'] = ''
-                        story_tag_ids = [t['tags_id'] for t in s['story_tags']]
-                        has_themes = False
-                        for t in tag_util.TagDiscoverer().nyt_themes_version_tags:
-                            if t in story_tag_ids:
-                                has_themes = True
-                        if has_themes:
-                            story_tag_ids = [t['tag'] for t in s['story_tags']
-                                             if t['tag_sets_id'] == tag_util.TagSetDiscoverer().nyt_themes_set]
-                            s['themes'] = ", ".join(story_tag_ids)
+            if include_story_tags and (s['stories_id'] in stories_with_tags_by_id):
+                s.update(stories_with_tags_by_id[s['stories_id']])
+                foci_names = [f['name'] for f in s['foci']]
+                s['subtopics'] = ", ".join(foci_names)
+                s['themes'] = ''
+                has_themes = any(t['tags_id'] in theme_version_tag_ids for t in s['story_tags'])
+                if has_themes:
+                    story_tag_ids = [t['tag'] for t in s['story_tags'] if t['tag_sets_id'] == themes_tag_sets_id]
+                    s['themes'] = ", ".join(story_tag_ids)
     return story_page
 
 
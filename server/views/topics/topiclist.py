@@ -6,6 +6,7 @@ from server import app, user_db
 from server.auth import user_mediacloud_client, user_name, user_admin_mediacloud_client,\
     user_is_admin
 from server.util.request import form_fields_required, arguments_required, api_error_handler
+import server.views.topics.apicache as apicache
 
 logger = logging.getLogger(__name__)
 
@@ -45,9 +46,8 @@ def topic_admin_list():
 @flask_login.login_required
 @api_error_handler
 def topic_favorites():
-    user_mc = user_mediacloud_client()
     favorite_topic_ids = user_db.get_users_lists(user_name(), 'favoriteTopics')
-    favorited_topics = [user_mc.topic(tid) for tid in favorite_topic_ids]
+    favorited_topics = apicache.topic_batch(favorite_topic_ids)
     for t in favorited_topics:
         t['isFavorite'] = True
     return jsonify({'topics': favorited_topics})
@@ -1,17 +1,21 @@
 import logging
-from flask import request, jsonify
+import concurrent.futures
+from flask import request, jsonify, json, Response, stream_with_context
 import flask_login
 
 from server import app, TOOL_API_KEY, executor
+from server.views import WORD_COUNT_SAMPLE_SIZE
 import server.util.csv as csv
 from server.util.request import api_error_handler, arguments_required, filters_from_args, json_error_response
 from server.auth import user_mediacloud_key
 import server.views.topics.apicache as apicache
+import server.views.apicache as base_apicache
 
 logger = logging.getLogger(__name__)
 
 WORD_CONTEXT_SIZE = 5   # for sentence fragments, this is the amount of words before & after that we return
-WORD2VEC_TIMESPAN_POOL_PROCESSES = 10
+WORD2VEC_OVERALL_NUM_WORDS = 50
+WORD2VEC_TIMESPAN_NUM_WORDS = 250
 
 
 @app.route('/api/topics/<topics_id>/words/subtopic-comparison.csv', methods=['GET'])
@@ -107,53 +111,65 @@ def topic_similar_words(topics_id, word):
 # Helper function for pooling word2vec timespans process
 @executor.job
 def _grab_timespan_embeddings(job):
-    ts_word_counts = apicache.cached_topic_word_counts(job['api_key'], job['topics_id'], num_words=250,
+    ts_word_counts = apicache.cached_topic_word_counts(job['api_key'], job['topics_id'],
+                                                       num_words=WORD2VEC_TIMESPAN_NUM_WORDS,
                                                        timespans_id=int(job['timespan']['timespans_id']),
                                                        snapshots_id=job['snapshots_id'],
                                                        foci_id=job['foci_id'],
                                                        q=job['q'])
-
+    overall_embeddings = job['overall_embeddings']
     # Remove any words not in top words overall
-    ts_word_counts = [x for x in ts_word_counts if x['term'] in job['overall_words']]
+    ts_word_counts = [x for x in ts_word_counts if x['term'] in overall_embeddings]
 
     # Replace specific timespan embeddings with overall so coordinates are consistent
     for word in ts_word_counts:
-        word['w2v_x'] = job['overall_embeddings'][word['term']][0]
-        word['w2v_y'] = job['overall_embeddings'][word['term']][1]
+        word['w2v_x'] = overall_embeddings[word['term']]['x']
+        word['w2v_y'] = overall_embeddings[word['term']]['y']
 
     return {'timespan': job['timespan'], 'words': ts_word_counts}
 
 
-def _get_all_timespan_embeddings(jobs):
-    # need to get the generator to actually run and return real data
-    results = [item for item in _grab_timespan_embeddings.map(jobs)]
-    return results
-
-
-@app.route('/api/topics/<topics_id>/word2vec-timespans', methods=['GET'])
-@flask_login.login_required
-@api_error_handler
-def topic_w2v_timespan_embeddings(topics_id):
+def _timespan_embedding_jobs(topics_id):
     snapshots_id, _timespans_id, foci_id, q = filters_from_args(request.args)
-    # Retrieve embeddings for overall topic
-    overall_word_counts = apicache.topic_word_counts(user_mediacloud_key(), topics_id, num_words=50,
-                                                     snapshots_id=snapshots_id, timespans_id=None, foci_id=foci_id, q=q)
-    overall_words = [x['term'] for x in overall_word_counts]
-    overall_embeddings = {x['term']: (x['google_w2v_x'], x['google_w2v_y']) for x in overall_word_counts}
+    # Retrieve top words overall, and where they are in the google news model (these are the only positions we use,
+    # so no need for the topic-specific model positions topic_word_counts would fetch too)
+    overall_word_counts = apicache.cached_topic_word_counts(user_mediacloud_key(), topics_id,
+                                                            num_words=WORD2VEC_OVERALL_NUM_WORDS,
+                                                            sample_size=WORD_COUNT_SAMPLE_SIZE,
+                                                            snapshots_id=snapshots_id, timespans_id=None,
+                                                            foci_id=foci_id, q=q)
+    overall_embeddings = base_apicache.word2vec_google_2d([x['term'] for x in overall_word_counts])
 
     # Retrieve top words for each timespan
     timespans = apicache.topic_timespan_list(topics_id, snapshots_id, foci_id)
-
-    # Retrieve embeddings for each timespan
-    jobs = [{
+    return [{
         'api_key': user_mediacloud_key(),
         'topics_id': topics_id,
         'snapshots_id': snapshots_id,
         'foci_id': foci_id,
-        'overall_words': overall_words,
         'overall_embeddings': overall_embeddings,
         'q': q,
         'timespan': t,
     } for t in timespans]
-    embeddings_by_timespan = _get_all_timespan_embeddings(jobs)
+
+
+@app.route('/api/topics/<topics_id>/word2vec-timespans', methods=['GET'])
+@flask_login.login_required
+@api_error_handler
+def topic_w2v_timespan_embeddings(topics_id):
+    jobs = _timespan_embedding_jobs(topics_id)
+    embeddings_by_timespan = list(_grab_timespan_embeddings.map(jobs))
     return jsonify({'list': embeddings_by_timespan})
+
+
+@app.route('/api/topics/<topics_id>/word2vec-timespans.ndjson', methods=['GET'])
+@flask_login.login_required
+@api_error_handler
+def topic_w2v_timespan_embeddings_stream(topics_id):
+    # same as above, but sends each timespan as a line of JSON as soon as it is ready (not in timespan order)
+    futures = [_grab_timespan_embeddings.submit(job) for job in _timespan_embedding_jobs(topics_id)]
+
+    def timespans_as_they_finish():
+        for future in concurrent.futures.as_completed(futures):
+            yield json.dumps(future.result()) + "\n"
+    return Response(stream_with_context(timespans_as_they_finish()), mimetype='application/x-ndjson')
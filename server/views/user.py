@@ -13,6 +13,8 @@ from server import app, auth, mc, user_db
 from server.auth import user_mediacloud_client, user_name, user_is_admin
 from server.util.request import api_error_handler, form_fields_required, arguments_required, json_error_response
 from server.views.topics.topiclist import topics_user_can_access
+import server.views.apicache as base_apicache
+import server.views.topics.apicache as topics_apicache
 
 logger = logging.getLogger(__name__)
 
@@ -275,7 +277,7 @@ def _save_user_data_dir(u, user_mc):
     # starred sources
     with open(os.path.join(temp_dir, 'starred-sources.csv'), 'w') as outfile:
         user_favorited = user_db.get_users_lists(user_name(), 'favoriteSources')
-        media_sources = [user_mc.media(media_id) for media_id in user_favorited]
+        media_sources = base_apicache.media_batch(user_favorited)
         media_sources = [{
             'media_id': m['media_id'],
             'name': m['name'],
@@ -287,7 +289,7 @@ def _save_user_data_dir(u, user_mc):
     # starred collections
     with open(os.path.join(temp_dir, 'starred-collections.csv'), 'w') as outfile:
         user_favorited = user_db.get_users_lists(user_name(), 'favoriteCollections')
-        collections = [user_mc.tag(tags_id) for tags_id in user_favorited]
+        collections = base_apicache.tag_batch(user_favorited)
         collections = [{
             'tags_id': c['tags_id'],
             'label': c['label'],
@@ -299,7 +301,7 @@ def _save_user_data_dir(u, user_mc):
     # starred topics
     with open(os.path.join(temp_dir, 'starred-topics.csv'), 'w') as outfile:
         user_favorited = user_db.get_users_lists(user_name(), 'favoriteTopics')
-        topics = [user_mc.topic(topics_id) for topics_id in user_favorited]
+        topics = topics_apicache.topic_batch(user_favorited)
         topics = [{
             'topics_id': t['topics_id'],
             'name': t['name'],
@@ -39,6 +39,57 @@ export function createApiPromise(url, params, httpMethod = 'get') {
   );
 }
 
+/**
+ * Helper to create a promise that calls an API endpoint on the server that streams back newline-delimited JSON
+ * (one object per line, sent as each one is ready). Lines are parsed as they arrive, and the promise resolves to
+ * `{ list }` with all the objects once the response is finished (or to the parsed error, same as
+ * `createApiPromise`, if the request failed).
+ */
+export function createNdjsonApiPromise(url, params) {
+  let fullUrl = url;
+  if ((params !== undefined) && (params !== null)) {
+    fullUrl = `${url}?${generateParamStr(params)}`;
+  }
+  const items = [];
+  const handleLine = (line) => {
+    if (line.trim().length === 0) {
+      return;
+    }
+    items.push(JSON.parse(line));
+  };
+  return fetch(fullUrl, {
+    method: 'get',
+    credentials: 'include',
+  }).then((response) => {
+    if (!response.ok) {
+      // errors come back as one regular JSON object
+      return response.json();
+    }
+    if (!response.body || !response.body.getReader) {
+      // no streaming support, so wait for the whole thing
+      return response.text().then((text) => {
+        text.split('\n').forEach(handleLine);
+        return { list: items };
+      });
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    const readChunk = () => reader.read().then(({ done, value }) => {
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+      const lines = buffer.split('\n');
+      buffer = lines.pop(); // the last one might not be complete yet
+      lines.forEach(handleLine);
+      if (done) {
+        handleLine(buffer);
+        return { list: items };
+      }
+      return readChunk();
+    });
+    return readChunk();
+  });
+}
+
 export function objectToFormData(obj) {
   const formData = new FormData();
   if (obj !== undefined) {
@@ -170,9 +170,33 @@ export function updateSourceSuggestion(params) {
   return createPostingApiPromise(`/api/sources/suggestions/${acceptedParams.suggestionId}/update`, acceptedParams);
 }
 
+const UPLOAD_JOB_POLL_MS = 2000;
+
+function pollSourceUploadJob(jobId) {
+  return new Promise(resolve => setTimeout(resolve, UPLOAD_JOB_POLL_MS))
+    .then(() => createApiPromise(`/api/collections/upload-sources/jobs/${jobId}`))
+    .then((job) => {
+      if (job.status === 'complete') {
+        // same as the old synchronous upload returned: just the sources that worked
+        return { status: 'Success', results: job.results.filter(src => src.status !== 'error') };
+      }
+      if ((job.status === 'error') || job.statusCode) { // statusCode means the job couldn't be found
+        return { status: 'Error', message: job.message };
+      }
+      return pollSourceUploadJob(jobId);
+    });
+}
+
+// uploads run as a background job on the server, so start one and then wait for it to finish
 export function collectionUploadSourceListFromTemplate(params) {
   const acceptedParams = acceptParams(params, ['file']);
-  return createPostingApiPromise('/api/collections/upload-sources', acceptedParams);
+  return createPostingApiPromise('/api/collections/upload-sources/jobs', acceptedParams)
+    .then((results) => {
+      if (!results.job_id) { // the CSV couldn't be parsed, or the job couldn't be started
+        return results;
+      }
+      return pollSourceUploadJob(results.job_id);
+    });
 }
 
 export function systemStats() {
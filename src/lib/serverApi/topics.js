@@ -1,4 +1,4 @@
-import { createApiPromise, createPostingApiPromise, acceptParams } from '../apiUtil';
+import { createApiPromise, createPostingApiPromise, createNdjsonApiPromise, acceptParams } from '../apiUtil';
 import { platformQueryParams } from './platforms';
 
 export function topicsPersonalList(linkId) {
@@ -208,7 +208,8 @@ export function topicWord2Vec(topicId) {
 
 export function topicWord2VecTimespans(topicId, params) {
   const acceptedParams = acceptParams(params, ['snapshotId', 'focusId', 'q']);
-  return createApiPromise(`/api/topics/${topicId}/word2vec-timespans`, acceptedParams);
+  // each timespan is sent as soon as it is ready, so they can come back in any order
+  return createNdjsonApiPromise(`/api/topics/${topicId}/word2vec-timespans.ndjson`, acceptedParams);
 }
 
 export function topicSimilarWords(topicId, theWord, params) {
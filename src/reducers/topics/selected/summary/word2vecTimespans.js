@@ -20,7 +20,8 @@ const word2VecTimespanEmbeddings = createAsyncReducer({
   },
   action: FETCH_TOPIC_WORD2VEC_TIMESPANS,
   handleSuccess: (payload) => {
-    const list = addJsDates(payload.list);
+    // the server streams these back as they finish, so put them back in date order
+    const list = addJsDates(payload.list).sort((a, b) => a.timespan.startDateObj - b.timespan.startDateObj);
     return { list };
   },
 });